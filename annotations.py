@@ -0,0 +1,155 @@
+"""
+labelme 标注库：启动时索引 tasks/ 下全部 JSON，点击区域 / 识别范围直接从内存取
+
+- 每个标注预先算好第一个形状的像素框 box（相对原截图，含边框）和百分比框 percent（a_percentage，相对内容区域）
+- get() 按 JSON 的 mtime 检查，文件变动自动重新读取；新加的 JSON 第一次用到时读取
+- key 与 TemplateBank 一致：相对项目根目录、去掉后缀的路径，传 .png/.json/无后缀 均可；
+  项目目录之外的文件以去掉后缀的绝对路径为 key，同样按需读取
+
+用法：
+    from annotations import annotations
+    ann = annotations.get("tasks/transport/mouse_combo/chose.png")
+    ann.box       # [[x1, y1], [x2, y2]] 像素
+    ann.percent   # [[px1, py1], [px2, py2]] a_percentage
+"""
+import os
+import json
+import threading
+from pathlib import Path
+
+from coordinate_utils import BORDER_JSON, load_borders
+
+PROJECT_ROOT = Path(__file__).parent
+SUFFIXES = {".png", ".jpg", ".jpeg", ".json"}
+
+
+def to_percentage(box, image_size, border_json=BORDER_JSON):
+    """
+    截图像素框 → a_percentage（与 CoordinateConverter(points, 'a_pixel', obj=图片路径) 的结果相同）：
+    有边框配置时按边框配置的截图尺寸扣掉边框，落在边框内报错；没有时直接除以截图尺寸
+    """
+    borders, frame_size = load_borders(border_json)
+    if frame_size is None:
+        w, h = image_size
+        return [[x / w, y / h] for x, y in box]
+    content_w = frame_size[0] - borders['left'] - borders['right']
+    content_h = frame_size[1] - borders['top'] - borders['bottom']
+    result = []
+    for x, y in box:
+        cx, cy = x - borders['left'], y - borders['top']
+        if cx < 0 or cy < 0 or cx > content_w or cy > content_h:
+            raise ValueError(f"坐标[{x}, {y}]在边框区域内，无法转换为内容区域百分比")
+        result.append([cx / content_w, cy / content_h])
+    return result
+
+
+class Annotation:
+    """单个 labelme JSON：第一个形状的像素框 / 百分比框 + 全部形状"""
+
+    def __init__(self, key, json_path):
+        self.key = key
+        self.json_path = str(json_path)
+        self.box = None          # 第一个形状的外接矩形 [[x1,y1],[x2,y2]]（像素，浮点）
+        self.percent = None      # box 的 a_percentage；落在边框内时为 None，见 error
+        self.error = None
+        self.image_size = None   # 原截图尺寸 (w, h)
+        self.label = None
+        self.shapes = []         # [(label, box), ...] 全部形状
+        self._mtime = None
+
+    def is_stale(self):
+        try:
+            return os.stat(self.json_path).st_mtime_ns != self._mtime
+        except OSError:
+            return True
+
+    def load(self):
+        mtime = os.stat(self.json_path).st_mtime_ns
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        shapes = []
+        for shape in data.get('shapes', []):
+            points = shape['points']
+            xs, ys = [p[0] for p in points], [p[1] for p in points]
+            shapes.append((shape.get('label'), [[min(xs), min(ys)], [max(xs), max(ys)]]))
+        if not shapes:
+            raise ValueError(f"标注中没有形状: {self.json_path}")
+        self.shapes = shapes
+        self.label, self.box = shapes[0]
+        self.image_size = (data.get('imageWidth', 0), data.get('imageHeight', 0))
+        try:
+            self.percent, self.error = to_percentage(self.box, self.image_size), None
+        except (ValueError, ZeroDivisionError) as e:
+            self.percent, self.error = None, e
+        self._mtime = mtime
+        return self
+
+
+class AnnotationStore:
+    def __init__(self, root="tasks", base_dir=PROJECT_ROOT, preload=True):
+        self.base_dir = Path(base_dir).resolve()
+        self.root = (self.base_dir / root).resolve()
+        self._entries = {}
+        self._lock = threading.Lock()
+        if preload:
+            self.load_all()
+
+    def key_of(self, path):
+        """路径(str/Path, 可带 .png/.json 后缀, 可为绝对路径) → key；项目目录之外的为绝对路径"""
+        p = Path(path)
+        if p.suffix.lower() in SUFFIXES:
+            p = p.with_suffix("")
+        if p.is_absolute():
+            p = p.resolve()
+            try:
+                p = p.relative_to(self.base_dir)
+            except ValueError:
+                pass
+        return p.as_posix()
+
+    def load_all(self):
+        """扫描 root 下全部 JSON 并读取"""
+        if not self.root.exists():
+            print(f"⚠️ 标注目录不存在: {self.root}")
+            return self
+        for path in sorted(self.root.rglob("*.json")):
+            key = self.key_of(path)
+            try:
+                entry = Annotation(key, path).load()
+            except Exception:
+                continue  # 非 labelme 的 JSON（如 matchers.json）
+            with self._lock:
+                self._entries[key] = entry
+        return self
+
+    def get(self, path_or_key):
+        """取标注；未读取过则按需读取，mtime 变化则重新读取，文件不存在返回 None"""
+        key = self.key_of(path_or_key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not entry.is_stale():
+            return entry
+        json_path = Path(key + ".json")
+        if not json_path.is_absolute():
+            json_path = self.base_dir / json_path
+        if not json_path.exists():
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        entry = Annotation(key, json_path).load()
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def __contains__(self, path_or_key):
+        return self.get(path_or_key) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        return list(self._entries.keys())
+
+
+# 进程内共用
+annotations = AnnotationStore()
@@ -0,0 +1,244 @@
+"""
+截图后端
+
+- pyautogui: 原方案（PIL 截图 → RGB → BGR），需要可见桌面
+- mss:       直接拿 BGRA 内存，不经过 PIL，比 pyautogui 快；每个线程一个 mss 实例（mss 句柄不能跨线程）
+- replay:    从截图目录或视频文件依次回放帧，无需桌面，可在 Linux 上跑整个识别/状态流程和基准测试
+
+所有后端 grab(region) 返回 Frame；region 为屏幕像素 (left, top, width, height)，None 为全屏
+live 为 False 的后端（replay）不对应真实窗口，Operator 不激活窗口、点击只打印不执行
+
+CaptureWorker: 可选的后台连续截图线程，按 fps 把帧写进预分配的环形缓冲，识别时直接取最新帧，
+点击后可等待一帧比点击时刻更新的画面（Operator.start_stream 开启）
+
+用法：
+    Operator(app_name, capture="mss")
+    StateManager("tasks/states.txt", capture="replay:window")      # 回放 window/ 目录
+    StateManager("tasks/states.txt", capture="replay:run.mp4")     # 回放录像
+"""
+import time
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame import Frame
+
+PROJECT_ROOT = Path(__file__).parent
+BACKENDS = ("pyautogui", "mss", "replay")
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+class PyAutoGUICapture:
+    name = "pyautogui"
+    live = True
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def grab(self, region=None):
+        img = self._pyautogui.screenshot(region=region)
+        return Frame.from_rgb(np.array(img))
+
+
+class MSSCapture:
+    name = "mss"
+    live = True
+
+    def __init__(self):
+        import mss
+        self._mss = mss
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def grab(self, region=None):
+        sct = self._sct()
+        if region is None:
+            monitor = sct.monitors[1]  # 主屏幕（monitors[0] 是所有屏幕拼起来的虚拟屏）
+        else:
+            left, top, width, height = region
+            monitor = {"left": int(left), "top": int(top), "width": int(width), "height": int(height)}
+        # BGRA 原始内存，Frame 构建时一次 cvtColor 去掉 alpha 通道
+        return Frame(np.asarray(sct.grab(monitor)))
+
+
+class ReplayCapture:
+    """
+    回放截图目录（按文件名排序）或视频文件；region 被忽略（录制的帧本身就是窗口画面）
+    loop=True 时播完从头开始，否则停在最后一帧
+    """
+    name = "replay"
+    live = False
+
+    def __init__(self, source, loop=True):
+        path = Path(source)
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        self.source = path
+        self.loop = loop
+        self.index = 0
+        self._files = None
+        self._video = None
+        self._last = None
+        if path.is_dir():
+            self._files = sorted(f for f in path.iterdir() if f.suffix.lower() in IMAGE_SUFFIXES)
+            if not self._files:
+                raise ValueError(f"回放目录中没有图片: {path}")
+        elif path.exists():
+            self._video = cv2.VideoCapture(str(path))
+            if not self._video.isOpened():
+                raise ValueError(f"无法打开回放视频: {path}")
+        else:
+            raise FileNotFoundError(f"回放源不存在: {path}")
+
+    def __len__(self):
+        if self._files is not None:
+            return len(self._files)
+        return int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def _next_image(self):
+        if self._files is not None:
+            if self.index >= len(self._files):
+                if not self.loop:
+                    return None
+                self.index = 0
+            f = self._files[self.index]
+            return cv2.imdecode(np.fromfile(str(f), dtype=np.uint8), cv2.IMREAD_COLOR)
+        ok, img = self._video.read()
+        if not ok and self.loop:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, img = self._video.read()
+        return img if ok else None
+
+    def grab(self, region=None):
+        img = self._next_image()
+        if img is None:
+            return self._last  # 不循环时停在最后一帧
+        self.index += 1
+        self._last = Frame(img)
+        return self._last
+
+
+class CaptureWorker:
+    """
+    后台连续截图（每个窗口一个）：
+    - 帧写入 size 个预分配数组组成的环形缓冲，不再每帧分配内存
+    - latest() 取最新帧，wait_newer(t) 等待时间戳晚于 t 的帧（如点击之后的画面）
+    - 每个调用方（consumer，如各 Operator）各自固定住自己拿到的帧所在槽位，直到它下一次 latest()/wait_newer()；
+      需要更久保留请 copy()。size 至少为 调用方数 + 2（最新帧 / 正在写入），没有空闲槽位时丢弃本帧
+    - mark_action() 记录输入动作时刻，之后的 latest() 自动等待动作之后的帧，避免拿到点击前的旧画面
+    """
+
+    def __init__(self, capturer, region_fn=None, fps=10, size=4):
+        if size < 3:
+            raise ValueError("环形缓冲至少需要 3 个槽位（最新帧 / 调用方持有 / 正在写入）")
+        self.capturer = capturer
+        self.region_fn = region_fn or (lambda: None)
+        self.interval = 1.0 / fps
+        self.size = size
+        self.slots = [None] * size     # 预分配的帧数组，尺寸变化时重新分配
+        self.frames = [None] * size    # 各槽位对应的 Frame 视图（含截图时间）
+        self.newest = -1               # 最新帧所在槽位
+        self.pins = {}                 # 调用方 → 其正在使用的槽位
+        self.last_action = 0.0
+        self.grabbed = 0
+        self.dropped = 0               # 所有槽位都被占用而丢弃的帧数
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="capture-worker")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            started = time.time()
+            try:
+                frame = self.capturer.grab(self.region_fn())
+            except Exception as e:
+                print(f"⚠️ 后台截图失败: {e}")
+                frame = None
+            if frame is not None:
+                self._store(frame, started)
+            self._stop.wait(max(0.0, self.interval - (time.perf_counter() - t0)))
+
+    def _store(self, frame, started):
+        """帧时间记为开始截图的时刻：截图过程中发生的点击不会被误认为已反映在画面里"""
+        with self._cond:
+            busy = {self.newest, *self.pins.values()}
+            slot = next((i for i in range(self.size) if i not in busy), None)
+            if slot is None:
+                self.dropped += 1
+                return
+        buf = self.slots[slot]
+        if buf is None or buf.shape != frame.shape:
+            buf = self.slots[slot] = np.empty(frame.shape, np.uint8)
+        np.copyto(buf, frame)
+        view = Frame(buf, started)
+        with self._cond:
+            self.frames[slot] = view
+            self.newest = slot
+            self.grabbed += 1
+            self._cond.notify_all()
+
+    def mark_action(self):
+        self.last_action = time.time()
+
+    def wait_newer(self, t, timeout=2.0, consumer=None):
+        """等待截图时间晚于 t 的帧，超时返回 None；返回的帧为 consumer 固定，直到它下一次取帧"""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while self.newest < 0 or self.frames[self.newest].t <= t:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
+            self.pins[consumer] = self.newest
+            return self.frames[self.newest]
+
+    def latest(self, timeout=2.0, consumer=None):
+        """最新帧；有未被观察到的输入动作时等待动作之后的帧"""
+        return self.wait_newer(self.last_action, timeout, consumer)
+
+
+def create_capture(backend="auto"):
+    """
+    backend: "auto"（有 mss 用 mss，否则 pyautogui） / "pyautogui" / "mss" / "replay:<目录或视频>"
+    也可直接传入已创建的后端对象
+    """
+    if not isinstance(backend, str):
+        return backend
+    if backend.startswith("replay:"):
+        return ReplayCapture(backend.split(":", 1)[1])
+    if backend == "auto":
+        try:
+            return MSSCapture()
+        except ImportError:
+            return PyAutoGUICapture()
+    if backend == "mss":
+        return MSSCapture()
+    if backend == "pyautogui":
+        return PyAutoGUICapture()
+    raise ValueError(f"未知截图后端: {backend}，可选 auto/pyautogui/mss/replay:<路径>")
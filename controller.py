@@ -2,6 +2,7 @@ import time
 import win32gui
 import win32con
 import threading
+from window_registry import registry
 
 class GameController:
     def __init__(self, gui_update_callback):
@@ -10,9 +11,13 @@ class GameController:
 
     def force_focus(self, hwnd):
         """强力弹出并置顶窗口"""
+        if registry.geometry(hwnd) is None:  # 实际读取窗口位置，已关闭的窗口读不到
+            print(f"窗口 {hwnd} 已关闭")
+            return False
         try:
             if win32gui.IsIconic(hwnd):
                 win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+                registry.moved(hwnd)
             win32gui.SetForegroundWindow(hwnd)
             win32gui.ShowWindow(hwnd, win32con.SW_SHOW)
             return True
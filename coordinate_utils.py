@@ -1,15 +1,133 @@
-import pygetwindow as gw
 import cv2
 import numpy as np
 from typing import Union, List, Optional, Dict, Tuple
-import pyautogui
 import os
 import json
+from window_registry import registry
+
+# 窗口边框配置（labelme JSON：第一个矩形为内容区域）
+BORDER_JSON = "F:\\DNF\\dnf-ai\\mission_group\\recognition\\kuangjia\\1.json"
+SPACES = ('s_pixel', 's_percentage', 'a_pixel', 'a_percentage')
+
+_border_cache = {}
+_screen_size = None
+
 
 def check_coords(coord):
     coords = coord if isinstance(coord[0], list) else [coord]
     return all(0 <= x <= 1 and 0 <= y <= 1 for x, y in coords)
 
+
+def screen_size():
+    """屏幕尺寸 (宽, 高)，进程内只查询一次（pyautogui 用到时才导入）"""
+    global _screen_size
+    if _screen_size is None:
+        import pyautogui
+        _screen_size = tuple(pyautogui.size())
+    return _screen_size
+
+
+def load_borders(json_path):
+    """
+    读取边框配置，每个路径只读一次
+    返回 (borders, json_image_size)；文件不存在或解析失败时边框全为 0，json_image_size 为 None
+    """
+    if json_path in _border_cache:
+        return _border_cache[json_path]
+    borders = {'left': 0, 'right': 0, 'top': 0, 'bottom': 0}
+    image_size = None
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if 'shapes' in data and len(data['shapes']) > 0:
+            points = data['shapes'][0]['points']
+            imageHeight = data.get('imageHeight', 0)
+            imageWidth = data.get('imageWidth', 0)
+            image_size = (imageWidth, imageHeight)
+            borders = {
+                'left': points[0][0],
+                'right': imageWidth - points[1][0],
+                'top': points[0][1],
+                'bottom': imageHeight - points[1][1],
+            }
+    except Exception:
+        pass
+    _border_cache[json_path] = (borders, image_size)
+    return _border_cache[json_path]
+
+
+class WindowGeometry:
+    """
+    窗口坐标换算（替代每次点击都新建 CoordinateConverter）：
+    - 每个坐标系到屏幕像素都是按轴缩放 + 平移的仿射变换 p_screen = p * scale + offset，构造时算好
+    - 任意两个坐标系之间的变换由此组合并缓存，批量点一次 NumPy 运算
+    - for_window(hwnd) 按窗口缓存，只有窗口位置/大小变化时才重建
+    """
+    _cache = {}  # hwnd → WindowGeometry
+
+    def __init__(self, rect, json_path=BORDER_JSON):
+        """rect: 窗口 (left, top, width, height)，包含边框"""
+        self.rect = tuple(rect)
+        self.json_path = json_path
+        self.borders, _ = load_borders(json_path)
+        left, top, width, height = self.rect
+        b = self.borders
+        self.content = (left + b['left'], top + b['top'],
+                        width - b['left'] - b['right'], height - b['top'] - b['bottom'])
+        cx, cy, cw, ch = self.content
+        self._to_screen = {
+            's_pixel': (np.array([1.0, 1.0]), np.array([0.0, 0.0])),
+            'a_pixel': (np.array([1.0, 1.0]), np.array([left, top], float)),
+            'a_percentage': (np.array([cw, ch], float), np.array([cx, cy], float)),
+        }
+        self._pairs = {}
+
+    @classmethod
+    def for_window(cls, hwnd, json_path=BORDER_JSON):
+        """取窗口的换算对象；窗口位置没变就复用，窗口已关闭返回 None，最小化时报错"""
+        rect = registry.geometry(hwnd)
+        if rect is None:
+            return None
+        if rect.left < 0:
+            raise ValueError(f"未检出到{hwnd}窗口（已最小化或不在屏幕内）")
+        geo = cls._cache.get(hwnd)
+        if geo is None or geo.rect != tuple(rect) or geo.json_path != json_path:
+            geo = cls._cache[hwnd] = cls(rect, json_path)
+        return geo
+
+    def _screen_affine(self, space):
+        if space == 's_percentage' and space not in self._to_screen:
+            sw, sh = screen_size()
+            self._to_screen[space] = (np.array([sw, sh], float), np.array([0.0, 0.0]))
+        if space not in self._to_screen:
+            raise ValueError(f"未知坐标类型: {space}，可选 {SPACES}")
+        return self._to_screen[space]
+
+    def affine(self, src, dst):
+        """src 坐标系 → dst 坐标系的 (scale, offset)"""
+        key = (src, dst)
+        if key not in self._pairs:
+            s1, o1 = self._screen_affine(src)
+            s2, o2 = self._screen_affine(dst)
+            self._pairs[key] = (s1 / s2, (o1 - o2) / s2)
+        return self._pairs[key]
+
+    def convert(self, points, src, dst='s_pixel', check=True):
+        """
+        points: 单个点 [x, y] 或多个点 [[x1, y1], ...]，返回同形状的 ndarray
+        check: 转到 a_pixel / a_percentage 时检查点是否落在窗口 / 内容区域内，不在则报错
+        """
+        pts = np.asarray(points, dtype=float)
+        scale, offset = self.affine(src.lower(), dst.lower())
+        out = pts * scale + offset
+        if check and dst in ('a_pixel', 'a_percentage'):
+            upper = (1.0, 1.0) if dst == 'a_percentage' else self.rect[2:]
+            flat = out.reshape(-1, 2)
+            if (flat < 0).any() or (flat > upper).any():
+                raise ValueError(f"坐标 {np.asarray(points).tolist()} 不在窗口{'内容区域' if dst == 'a_percentage' else ''}内")
+        return out
+
+
 class CoordinateConverter:
     """坐标转换工具类，支持屏幕坐标和应用窗口坐标之间的转换，支持固定边框"""
     
@@ -17,7 +135,7 @@ class CoordinateConverter:
                  coord: Union[List[float], List[List[float]]], 
                  coord_type: str,
                  obj: Union[str, np.ndarray] = None,
-                 json_path="F:\\DNF\\dnf-ai\\mission_group\\recognition\\kuangjia\\1.json",
+                 json_path=BORDER_JSON,
                  ):
         """
         初始化坐标转换器
@@ -29,10 +147,10 @@ class CoordinateConverter:
                 - a_percentage: 相对于内容区域的百分比（不包含边框）
                 - s_pixel: 屏幕绝对像素坐标
                 - s_percentage: 屏幕百分比坐标
-            obj: 可以是图片路径(str)、cv图片(ndarray)或app名称(str)
+            obj: 可以是图片路径(str)、cv图片(ndarray)、app名称(str)或窗口句柄(int)
             json_path: JSON配置文件路径，包含边框信息
         """
-        self.screen_width, self.screen_height = pyautogui.size()
+        self.screen_width, self.screen_height = screen_size()
         self._original_coord = coord
         self._coord_type = coord_type.lower()
         self._is_single = not isinstance(coord[0], (list, tuple))
@@ -65,7 +183,7 @@ class CoordinateConverter:
         self._calculate_all_coordinates()
 
         image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
-        if type(obj) != np.ndarray:
+        if isinstance(obj, str):
             if obj and any(obj.lower().endswith(ext) for ext in image_extensions): 
                 if self._get_result('a_percentage') is None and self._get_result('a_pixel'):
                     raise ValueError("无法转化成百分比坐标")
@@ -73,30 +191,11 @@ class CoordinateConverter:
                     raise ValueError("无法转化成像素坐标")
     
     def _parse_json_config(self, json_path: str):
-        """解析JSON配置文件，获取边框信息"""
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            if 'shapes' in data and len(data['shapes']) > 0:
-                points = data['shapes'][0]['points']
-                imageHeight = data.get('imageHeight', 0)
-                imageWidth = data.get('imageWidth', 0)
-                
-                # 保存JSON中的图片尺寸
-                self._json_image_size = (imageWidth, imageHeight)
-                
-                # 计算边框
-                self._borders['left'] = points[0][0]
-                self._borders['right'] = imageWidth - points[1][0]
-                self._borders['top'] = points[0][1]
-                self._borders['bottom'] = imageHeight - points[1][1]
-                
-                #print(f"加载边框配置: 左={self._borders['left']}, 右={self._borders['right']}, "
-                      #f"上={self._borders['top']}, 下={self._borders['bottom']}")
-        except Exception as e:
-            pass
-            #print(f"解析JSON配置文件失败: {e}")
+        """解析JSON配置文件，获取边框信息（同一文件只读一次）"""
+        borders, image_size = load_borders(json_path)
+        self._borders.update(borders)
+        if image_size is not None:
+            self._json_image_size = image_size
     
     def _get_content_area(self) -> Tuple[float, float, float, float]:
         """获取内容区域的位置和大小（去除边框）"""
@@ -117,6 +216,9 @@ class CoordinateConverter:
         if isinstance(obj, np.ndarray):
             # cv图片
             self._image_size = (obj.shape[1], obj.shape[0])  # (width, height)
+        elif isinstance(obj, int):
+            # 窗口句柄（多开时同名窗口有多个，用句柄才能定位到指定窗口）
+            self._bind_window(registry.get(obj), obj)
         elif isinstance(obj, str):
             # 判断是图片路径还是app名称
             # 检查是否是图片文件（通过扩展名判断）
@@ -129,15 +231,21 @@ class CoordinateConverter:
                         self._image_size = (img.shape[1], img.shape[0])
             else:
                 # app名称
-                try:
-                    windows = gw.getWindowsWithTitle(obj)
-                    if windows:
-                        if windows[0].left >= 0:
-                            self._app_window = windows[0]
-                        else:
-                            raise ValueError(f"未检出到{obj}窗口")
-                except:
-                    raise ValueError(f"未检出到{obj}窗口")
+                windows = registry.by_title(obj)
+                if windows:
+                    self._bind_window(windows[0], obj)
+
+    def _bind_window(self, window, name):
+        """
+        记录窗口位置快照（只读一次 GetWindowRect，之后的换算都用这份快照）
+        窗口不存在时不绑定；最小化（left < 0）或已关闭时报错
+        """
+        if window is None:
+            return
+        geo = registry.geometry(window._hWnd)
+        if geo is None or geo.left < 0:
+            raise ValueError(f"未检出到{name}窗口")
+        self._app_window = geo
     
     def _calculate_all_coordinates(self):
         """计算所有可能的坐标类型"""
@@ -0,0 +1,343 @@
+"""
+YOLO 检测后端
+
+- torch:  torch.hub 加载 ultralytics/yolov5 的 .pt 模型（原方案，需要 torch + hub 缓存/联网）
+- onnx:   ONNX Runtime 跑导出的 models/best.onnx（纯 CPU、离线）
+- dnn:    OpenCV-DNN 跑同一个 .onnx（无需额外依赖）
+
+所有后端的 detect(img_bgr) 都返回 Detections（NumPy 数组存储的 boxes / scores / class_ids + 类别名表），
+遍历时仍得到 {"name", "box": [[x1,y1],[x2,y2]], "conf"} 字典，兼容旧代码
+detect_batch([img_bgr, ...]) 一次前向处理多张图，返回每张图各自的 Detections
+导出命令（yolov5 仓库内）: python export.py --weights models/best.pt --include onnx
+"""
+import os
+import ast
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame import Frame
+
+BACKENDS = ("torch", "onnx", "dnn")
+
+
+# ==================== 前后处理 ====================
+
+def letterbox(img, size=640, color=(114, 114, 114)):
+    """等比缩放 + 填充到 size x size，返回 (图像, 缩放比例, (左填充, 上填充))"""
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    dw, dh = (size - nw) / 2, (size - nh) / 2
+    if (w, h) != (nw, nh):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def nms(boxes, scores, iou_thres):
+    """NumPy 版 NMS，boxes 为 (N,4) xyxy，返回保留的下标"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(pred, ratio, pad, orig_shape, conf_thres=0.25, iou_thres=0.45, max_det=1000):
+    """
+    yolov5 原始输出 (N, 5+nc): [cx, cy, w, h, obj, cls...] → 原图坐标下的 (boxes, scores, class_ids)
+    与 AutoShape 一致：score = obj * cls，按类别做 NMS
+    """
+    pred = pred[pred[:, 4] > conf_thres]
+    if not len(pred):
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+    cls_scores = pred[:, 5:] * pred[:, 4:5]
+    class_ids = cls_scores.argmax(1)
+    scores = cls_scores[np.arange(len(pred)), class_ids]
+    mask = scores > conf_thres
+    pred, class_ids, scores = pred[mask], class_ids[mask], scores[mask]
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    # 按类别偏移后一次 NMS，等价于逐类 NMS
+    keep = nms(boxes + class_ids[:, None] * 4096.0, scores, iou_thres)[:max_det]
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+    # 去掉 letterbox 填充并缩放回原图
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= ratio
+    oh, ow = orig_shape[:2]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, ow)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, oh)
+    return boxes.astype(np.float32), scores.astype(np.float32), class_ids.astype(np.int64)
+
+
+def _names_list(names):
+    """类别名统一成 list（yolov5 的 names 可能是 {id: name} 字典）"""
+    if isinstance(names, dict):
+        return [names[i] for i in sorted(names)]
+    return list(names) if names else []
+
+
+def load_class_names(onnx_path):
+    """
+    类别名：优先读同名 .names 文本（一行一个），其次读 yolov5 导出时写入 ONNX 的 metadata
+    """
+    names_file = Path(onnx_path).with_suffix(".names")
+    if names_file.exists():
+        with open(names_file, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    meta = None
+    try:
+        import onnxruntime as ort
+        sess = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+        meta = sess.get_modelmeta().custom_metadata_map.get("names")
+    except Exception:
+        try:
+            import onnx
+            model = onnx.load(str(onnx_path))
+            meta = next((p.value for p in model.metadata_props if p.key == "names"), None)
+        except Exception:
+            pass
+    if meta:
+        return _names_list(ast.literal_eval(meta))
+    return None
+
+
+def _require_names(names, onnx_path):
+    """
+    没有类别名时所有框都叫 "0"、"1"…，按 resource/bird 等关键字分组会全部落空，
+    宁可报错（create_detector auto 时换下一个后端）也不返回一个没有类别名的检测器
+    """
+    names = names or load_class_names(onnx_path)
+    if not names:
+        names_file = Path(onnx_path).with_suffix(".names")
+        raise ValueError(f"找不到 {onnx_path} 的类别名：请提供 {names_file}（一行一个类别名），"
+                         f"或安装 onnxruntime / onnx 从模型 metadata 读取")
+    return names
+
+
+class Detections:
+    """
+    一帧的检测结果（数组形式）
+    boxes: (N, 4) float32 xyxy；scores: (N,) float32；class_ids: (N,) int64；names: 类别名表
+    """
+
+    def __init__(self, boxes, scores, class_ids, names=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.names = _names_list(names)
+        self._tables = {}
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names)
+
+    @classmethod
+    def from_dicts(cls, items):
+        """[{"name", "box", "conf"}, ...]（to_dicts 的格式，旧接口的检测结果）→ Detections"""
+        items = list(items)
+        names = sorted({d["name"] for d in items})
+        index = {n: i for i, n in enumerate(names)}
+        return cls([[*d["box"][0], *d["box"][1]] for d in items] or np.zeros((0, 4)),
+                   [d.get("conf", 1.0) for d in items],
+                   [index[d["name"]] for d in items], names)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        """布尔掩码 / 下标数组 → 子集（共享类别名表）"""
+        sub = Detections(self.boxes[index], self.scores[index], self.class_ids[index], self.names)
+        sub._tables = self._tables
+        return sub
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def name_of(self, class_id):
+        return self.names[class_id] if class_id < len(self.names) else str(class_id)
+
+    def shift(self, ox, oy):
+        """整体平移（ROI 坐标 → 原图坐标）"""
+        if ox or oy:
+            self.boxes += np.array([ox, oy, ox, oy], dtype=np.float32)
+        return self
+
+    def class_mask(self, keyword):
+        """类别名包含 keyword（不区分大小写）的掩码；按类别表预先算好，逐框只做一次数组索引"""
+        table = self._tables.get(keyword)
+        if table is None:
+            kw = keyword.lower()
+            table = np.array([kw in n.lower() for n in self.names] + [False], dtype=bool)
+            self._tables[keyword] = table
+        ids = np.where(self.class_ids < len(self.names), self.class_ids, len(self.names))
+        return table[ids]
+
+    def split(self, *keywords):
+        """
+        按关键字优先级互斥分组：一个框只归入第一个命中的关键字
+        例: split("resource", "bird", "transport") → (资源, 鸟, 运输中)
+        """
+        taken = np.zeros(len(self), dtype=bool)
+        groups = []
+        for kw in keywords:
+            mask = self.class_mask(kw) & ~taken
+            taken |= mask
+            groups.append(self[mask])
+        return tuple(groups)
+
+    def box_list(self):
+        """[[[x1,y1],[x2,y2]], ...]，供 Operator.click 等直接使用"""
+        return self.boxes.reshape(-1, 2, 2).tolist()
+
+    def to_dicts(self):
+        return [{"name": self.name_of(c), "box": box, "conf": conf}
+                for box, conf, c in zip(self.box_list(), self.scores.tolist(), self.class_ids.tolist())]
+
+
+def overlap_matrix(a, b):
+    """
+    两组 xyxy 框两两是否相交（边界接触也算），返回 (len(a), len(b)) 布尔矩阵
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(1, -1, 4)
+    return ~((a[..., 2] < b[..., 0]) | (a[..., 0] > b[..., 2]) |
+             (a[..., 3] < b[..., 1]) | (a[..., 1] > b[..., 3]))
+
+
+# ==================== 后端 ====================
+
+class TorchHubDetector:
+    """原方案：torch.hub 加载 yolov5 .pt"""
+    name = "torch"
+
+    def __init__(self, model_path, device='cpu'):
+        import torch
+        self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=model_path, device=device)
+        self.names = _names_list(self.model.names)
+
+    def detect(self, img_bgr):
+        return self.detect_batch([img_bgr])[0]
+
+    def detect_batch(self, imgs_bgr):
+        """AutoShape 接收图片列表时会 letterbox 成一个 batch，一次前向"""
+        imgs_rgb = [img.rgb if isinstance(img, Frame) else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                    for img in imgs_bgr]
+        results = self.model(imgs_rgb)
+        out = []
+        for pred in results.xyxy:
+            pred = pred.cpu().numpy()  # (N, 6): x1, y1, x2, y2, conf, cls
+            out.append(Detections(pred[:, :4], pred[:, 4], pred[:, 5], results.names))
+        return out
+
+
+class OnnxDetector:
+    """ONNX Runtime CPU 推理，NMS 用 NumPy 实现"""
+    name = "onnx"
+
+    def __init__(self, model_path, names=None, conf_thres=0.25, iou_thres=0.45):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_size = inp.shape[2] if isinstance(inp.shape[2], int) else 640
+        # 导出时未加 --dynamic 则 batch 固定为 1，只能逐张推理
+        self.batch_ok = not isinstance(inp.shape[0], int) or inp.shape[0] != 1
+        self.names = _require_names(names, model_path)
+        self.conf_thres = conf_thres
+        self.iou_thres = iou_thres
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+    def detect(self, img_bgr):
+        return self.detect_batch([img_bgr])[0]
+
+    def detect_batch(self, imgs_bgr):
+        """多张图 letterbox 后拼成一个 batch 做一次前向，再按图拆分结果"""
+        boxed = [letterbox(img, self.input_size) for img in imgs_bgr]
+        blob = cv2.dnn.blobFromImages([b[0] for b in boxed], 1 / 255.0, swapRB=True)
+        if self.batch_ok or len(boxed) == 1:
+            try:
+                preds = self._forward(blob)
+            except Exception:
+                # 模型不支持动态 batch，之后都逐张推理
+                self.batch_ok = False
+                preds = [self._forward(blob[i:i + 1])[0] for i in range(len(boxed))]
+        else:
+            preds = [self._forward(blob[i:i + 1])[0] for i in range(len(boxed))]
+
+        results = []
+        for pred, img, (_, ratio, pad) in zip(preds, imgs_bgr, boxed):
+            boxes, scores, class_ids = postprocess(pred, ratio, pad, img.shape, self.conf_thres, self.iou_thres)
+            results.append(Detections(boxes, scores, class_ids, self.names))
+        return results
+
+
+class CvDnnDetector(OnnxDetector):
+    """OpenCV-DNN 推理同一个 .onnx，不依赖 onnxruntime"""
+    name = "dnn"
+
+    def __init__(self, model_path, names=None, conf_thres=0.25, iou_thres=0.45, input_size=640):
+        self.net = cv2.dnn.readNetFromONNX(str(model_path))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = input_size
+        self.names = _require_names(names, model_path)
+        self.conf_thres = conf_thres
+        self.iou_thres = iou_thres
+        self.batch_ok = True
+
+    def _forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()
+
+
+def create_detector(model_path, backend="auto"):
+    """
+    按 backend 创建检测器；auto 时若存在同名 .onnx 则优先 onnx → dnn，最后退回 torch
+    （依赖缺失、加载失败或读不到类别名的后端跳过）
+    模型文件不存在返回 None
+    """
+    onnx_path = str(Path(model_path).with_suffix(".onnx"))
+    pt_path = str(Path(model_path).with_suffix(".pt"))
+
+    if backend == "torch":
+        return TorchHubDetector(pt_path) if os.path.exists(pt_path) else None
+    if backend == "onnx":
+        return OnnxDetector(onnx_path) if os.path.exists(onnx_path) else None
+    if backend == "dnn":
+        return CvDnnDetector(onnx_path) if os.path.exists(onnx_path) else None
+
+    if os.path.exists(onnx_path):
+        for cls in (OnnxDetector, CvDnnDetector):
+            try:
+                return cls(onnx_path)
+            except ImportError:
+                continue
+            except Exception as e:
+                print(f"⚠️ {cls.name} 后端加载失败: {e}")
+    if os.path.exists(pt_path):
+        return TorchHubDetector(pt_path)
+    return None
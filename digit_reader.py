@@ -0,0 +1,163 @@
+"""
+数字模板识别（替代 EasyOCR 读游戏里的计数，如 "0/4"、"5"）
+
+- 字形库: tasks/transport/glyphs/<字符>_<序号>.png（二值小图，"/" 存为 slash）
+- 识别: ROI 灰度 → 大津法二值化（亮字为前景）→ 连通域切分 → 每个字形缩放到统一尺寸后与字形库逐一比对
+- 相似度为前景 IoU（只看笔画，不被大片背景拉高）；最像的字符要够像（min_score），
+  且要明显比第二像的其他字符更像（min_margin），否则返回 None，调用方可退回 OCR
+- 字形库只收录截图中实际出现过的字形（目前缺 2、7、9），不手工拼造：库里没有的字符靠 min_score /
+  min_margin 拒识后退回 OCR；遇到时用 learn() 从已知读数的截图补充
+"""
+import re
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import instrument
+from frame import Frame
+
+PROJECT_ROOT = Path(__file__).parent
+GLYPH_DIR = PROJECT_ROOT / "tasks" / "transport" / "glyphs"
+GLYPH_SIZE = (12, 16)  # 比对时统一缩放到的 (宽, 高)
+FILE_NAMES = {"/": "slash"}
+CHARS = {v: k for k, v in FILE_NAMES.items()}
+
+
+class DigitReader:
+    def __init__(self, glyph_dir=GLYPH_DIR, min_score=0.7, min_margin=0.15):
+        self.glyph_dir = Path(glyph_dir)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.labels = []
+        self.bank = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+        self.load()
+
+    def load(self):
+        """读取字形库，所有字形压成一个 (N, 宽*高) 矩阵，一次矩阵运算比对全部模板"""
+        labels, vecs = [], []
+        for f in sorted(self.glyph_dir.glob("*.png")):
+            img = cv2.imdecode(np.fromfile(str(f), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            name = f.stem.rsplit("_", 1)[0]
+            labels.append(CHARS.get(name, name))
+            vecs.append(self._normalize(img > 127))
+        self.labels = labels
+        if vecs:
+            self.bank = np.stack(vecs)
+        return self
+
+    # ==================== 切分 ====================
+    @staticmethod
+    def _roi(img, a_perc):
+        if isinstance(img, Frame):
+            return img.roi(a_perc)[0]
+        if not a_perc:
+            return img
+        h, w = img.shape[:2]
+        x1, y1 = int(a_perc[0][0] * w), int(a_perc[0][1] * h)
+        x2, y2 = int(a_perc[1][0] * w), int(a_perc[1][1] * h)
+        return img[y1:y2, x1:x2]
+
+    @staticmethod
+    def _normalize(mask):
+        """居中补边到 GLYPH_SIZE 的宽高比（保留 "1" 和 "/" 这类窄字形的形状），再缩放并展平"""
+        glyph = mask.astype(np.uint8) * 255
+        h, w = glyph.shape
+        tw, th = GLYPH_SIZE
+        if w * th < h * tw:
+            pad = (h * tw // th - w) // 2
+            glyph = cv2.copyMakeBorder(glyph, 0, 0, pad, pad, cv2.BORDER_CONSTANT, value=0)
+        else:
+            pad = (w * th // tw - h) // 2
+            glyph = cv2.copyMakeBorder(glyph, pad, pad, 0, 0, cv2.BORDER_CONSTANT, value=0)
+        glyph = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA)
+        return glyph.reshape(-1).astype(np.float32) / 255.0
+
+    def segment(self, img, a_percentage=None):
+        """返回从左到右的字形二值图列表（每个为 bool 数组，已裁到字形外接框）"""
+        roi = self._roi(img, a_percentage)
+        if isinstance(roi, Frame):
+            gray = roi.gray
+        else:
+            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        n, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+        # 去掉噪点；x 方向大部分重叠的连通域（断开的笔画）合并为一个字形
+        comps = sorted([x, y, x + w, y + h] for x, y, w, h, area in stats[1:]
+                       if area >= 3 and h >= binary.shape[0] * 0.3)
+        boxes = []
+        for x1, y1, x2, y2 in comps:
+            if boxes:
+                px1, py1, px2, py2 = boxes[-1]
+                if min(x2, px2) - x1 > 0.5 * min(x2 - x1, px2 - px1):
+                    boxes[-1] = [px1, min(py1, y1), max(px2, x2), max(py2, y2)]
+                    continue
+            boxes.append([x1, y1, x2, y2])
+
+        fg = binary > 0
+        return [fg[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+
+    # ==================== 识别 ====================
+    @instrument.timed("digits")
+    def read(self, img, a_percentage=None):
+        """识别 ROI 内的字符串；无字形或有字形认不出返回 None"""
+        glyphs = self.segment(img, a_percentage)
+        if not glyphs or not len(self.bank):
+            return None
+        vecs = np.stack([self._normalize(g) for g in glyphs])
+        scores = self.scores(vecs)
+        chars = sorted(set(self.labels))
+        # 每个字符取其所有样本中的最高分 → (字形数, 字符数)
+        per_char = np.stack([scores[:, [i for i, l in enumerate(self.labels) if l == c]].max(axis=1)
+                             for c in chars], axis=1)
+        order = np.argsort(-per_char, axis=1)
+        rows = np.arange(len(glyphs))
+        best = per_char[rows, order[:, 0]]
+        second = per_char[rows, order[:, 1]] if len(chars) > 1 else np.zeros(len(glyphs))
+        if (best < self.min_score).any() or (best - second < self.min_margin).any():
+            return None
+        return "".join(chars[i] for i in order[:, 0])
+
+    def scores(self, vecs):
+        """前景 IoU（缩放后的灰度值按模糊集合计算）: (字形数, 字形库样本数)"""
+        inter = np.minimum(vecs[:, None, :], self.bank[None, :, :]).sum(axis=2)
+        union = np.maximum(vecs[:, None, :], self.bank[None, :, :]).sum(axis=2)
+        return inter / np.maximum(union, 1e-6)
+
+    def read_ratio(self, img, a_percentage=None):
+        """读 "x/y" 形式的计数，返回 (x, y)；失败返回 (None, None)"""
+        text = self.read(img, a_percentage)
+        m = re.fullmatch(r'(\d+)/(\d+)', text or '')
+        if not m:
+            return None, None
+        return int(m.group(1)), int(m.group(2))
+
+    def read_int(self, img, a_percentage=None):
+        """读纯数字，失败返回 None"""
+        text = self.read(img, a_percentage)
+        return int(text) if text and text.isdigit() else None
+
+    # ==================== 字形采集 ====================
+    def learn(self, img, a_percentage, text):
+        """
+        用已知读数的截图补充字形库：切分出的字形个数需与 text（去掉空格）一致
+        返回新增的文件列表
+        """
+        text = text.replace(" ", "")
+        glyphs = self.segment(img, a_percentage)
+        if len(glyphs) != len(text):
+            print(f"⚠️ 切分出 {len(glyphs)} 个字形，与 '{text}' 长度不一致，未保存")
+            return []
+        self.glyph_dir.mkdir(parents=True, exist_ok=True)
+        saved = []
+        for ch, g in zip(text, glyphs):
+            name = FILE_NAMES.get(ch, ch)
+            idx = len(list(self.glyph_dir.glob(f"{name}_*.png"))) + 1
+            path = self.glyph_dir / f"{name}_{idx:02d}.png"
+            cv2.imencode(".png", g.astype(np.uint8) * 255)[1].tofile(str(path))
+            saved.append(path)
+        self.load()
+        return saved
@@ -0,0 +1,81 @@
+"""
+进程内共用的识别资源：多窗口、多任务只加载一份
+
+- vision(model):       MyVision（检测模型 / EasyOCR / 模板库 / 匹配后端），同一模型路径只建一个
+                       MyVision 的参数（detector_backend / pyramid_levels / matcher / debug_dump / search_margin）
+                       在第一次创建时生效：configure() 设置进程默认值，或在第一次 vision() 时直接传入
+- state_config(file):  编译好的 states.txt（配置、导航图、模板 key 表），同一文件只解析一次
+- digits():            数字字形库 DigitReader
+
+每个窗口的 TransportTask / StateManager 只保存这些共用对象的引用，自己只持有 Operator、FrameGate 等轻量状态
+MyVision 内部对模型加载和推理加锁，可在多个线程中同时使用
+
+用法：
+    from engine import engine
+    engine.configure(detector_backend="dnn", pyramid_levels=2)   # 在创建任务之前
+    v = engine.vision()
+    cfg = engine.state_config("tasks/states.txt")
+"""
+import threading
+from pathlib import Path
+
+DEFAULT_MODEL = "models/best.pt"
+
+
+class Engine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._visions = {}
+        self._configs = {}
+        self._digits = None
+        self._options = {}   # 新建 MyVision 的默认参数，见 configure()
+        self._created = {}   # 模型路径 → 创建时使用的参数
+
+    def configure(self, **options):
+        """设置之后新建的 MyVision 的参数；已创建的不受影响，需在创建任务之前调用"""
+        with self._lock:
+            if self._visions:
+                print(f"⚠️ 已创建 {len(self._visions)} 个 MyVision，参数只对之后新建的生效: {options}")
+            self._options.update(options)
+
+    def vision(self, yolo_model_path=DEFAULT_MODEL, **options):
+        """同一模型路径只建一个；options 为 MyVision 的参数，与 configure() 的默认值合并，只在第一次创建时生效"""
+        with self._lock:
+            v = self._visions.get(yolo_model_path)
+            if v is None:
+                import vision
+                # 所有模型共用同一个模板库
+                bank = next(iter(self._visions.values())).templates if self._visions else None
+                opts = self._created[yolo_model_path] = {**self._options, **options}
+                v = self._visions[yolo_model_path] = vision.MyVision(yolo_model_path=yolo_model_path,
+                                                                     template_bank=bank, **opts)
+            elif any(self._created[yolo_model_path].get(k) != val for k, val in options.items()):
+                print(f"⚠️ {yolo_model_path} 的 MyVision 已按 {self._created[yolo_model_path]} 创建，忽略参数 {options}")
+            return v
+
+    def state_config(self, states_file, yolo_model_path=DEFAULT_MODEL):
+        key = str(Path(states_file).resolve())
+        templates = self.vision(yolo_model_path).templates
+        with self._lock:
+            cfg = self._configs.get(key)
+            if cfg is None:
+                from state_config import StateConfig
+                cfg = self._configs[key] = StateConfig(states_file, templates)
+            return cfg
+
+    def digits(self):
+        with self._lock:
+            if self._digits is None:
+                from digit_reader import DigitReader
+                self._digits = DigitReader()
+            return self._digits
+
+    def warm_up(self, **kwargs):
+        """预加载所有已创建的 MyVision 的模型（见 MyVision.warm_up）"""
+        with self._lock:
+            visions = list(self._visions.values())
+        return [v.warm_up(**kwargs) for v in visions]
+
+
+# 进程内共用
+engine = Engine()
@@ -0,0 +1,91 @@
+"""
+Frame：一次截图及其派生表示（灰度、RGB、金字塔、ROI）
+
+- Frame 是 ndarray 子类（BGR、uint8、三通道、连续内存），旧代码按 ndarray 使用完全不受影响
+- gray / rgb / pyramid(levels) / roi(a_percentage) 第一次用到时才计算，之后直接复用，
+  同一帧在 find_image / classify / detect_yolo / detect_text / FrameGate 之间只转换一次
+- 约定截图是只读的：原地修改像素后缓存不会失效，需要画框等操作请先 copy()
+"""
+import time
+
+import cv2
+import numpy as np
+
+from template_bank import build_pyramid
+
+
+class Frame(np.ndarray):
+    def __new__(cls, img, t=None):
+        """img: BGR / BGRA / 灰度图；t: 截图时间（默认当前时间）"""
+        img = np.asarray(img)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        elif img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        obj = np.ascontiguousarray(img, dtype=np.uint8).view(cls)
+        obj.t = time.time() if t is None else t
+        return obj
+
+    def __array_finalize__(self, obj):
+        # 切片 / copy 得到的新 Frame 不继承缓存（内容或范围已不同）
+        self._cache = {}
+        self.t = getattr(obj, "t", None)
+
+    @classmethod
+    def of(cls, img):
+        """已是 Frame 则原样返回，None 原样返回，其余包装为 Frame（已是连续 uint8 BGR 时不复制）"""
+        if img is None or isinstance(img, cls):
+            return img
+        return cls(img)
+
+    @classmethod
+    def from_rgb(cls, rgb, t=None):
+        """由 RGB 图（如 pyautogui/PIL 截图）构建，RGB 表示直接留作缓存"""
+        rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        frame = cls(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), t)
+        frame._cache["rgb"] = rgb
+        return frame
+
+    def _memo(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
+    @property
+    def image(self):
+        """普通 ndarray 视图（不复制）"""
+        return self.view(np.ndarray)
+
+    @property
+    def gray(self):
+        return self._memo("gray", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        return self._memo("rgb", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+
+    def pyramid(self, levels):
+        """高斯金字塔 [原图, 1/2, ...]，已有更深的金字塔时直接复用"""
+        pyr = self._cache.get("pyramid")
+        if pyr is None or len(pyr) <= levels:
+            pyr = self._cache["pyramid"] = build_pyramid(self.image, levels)
+        return pyr
+
+    def roi(self, a_percentage):
+        """
+        按百分比范围裁切，返回 (连续内存的 Frame, (x1, y1))；同一范围只裁切一次
+        a_percentage 为空时返回 (自身, (0, 0))
+        """
+        if not a_percentage:
+            return self, (0, 0)
+        (px1, py1), (px2, py2) = a_percentage
+        key = ("roi", px1, py1, px2, py2)
+        cached = self._cache.get(key)
+        if cached is None:
+            h, w = self.shape[:2]
+            x1, y1 = int(px1 * w), int(py1 * h)
+            x2, y2 = int(px2 * w), int(py2 * h)
+            sub = Frame(self.image[y1:y2, x1:x2], self.t)
+            cached = self._cache[key] = (sub, (x1, y1))
+        return cached
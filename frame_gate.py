@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+from frame import Frame
+
+
+class FrameGate:
+    """
+    画面变化门控（每个窗口一个）：
+    - 每个识别结果（按 name）记住识别时所依赖区域 roi（a_percentage，默认全图）的灰度图
+    - 新帧同一区域逐像素比较，最大亮度差不超过 tolerance 才视为"没变"，直接复用该结果；
+      只要区域内有一个像素明显变化（如计数从 0 变 1）就重新识别
+    - 各 name 互不影响：某个区域变了只作废依赖它的结果
+    """
+
+    def __init__(self, tolerance=2):
+        self.tolerance = tolerance
+        self._refs = {}  # name → (roi, 灰度区域, 结果)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def crop(img, roi=None):
+        """roi 范围内的灰度图（Frame 的灰度图已缓存）"""
+        if isinstance(img, Frame):
+            gray = img.gray
+        else:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        if not roi:
+            return gray
+        h, w = gray.shape[:2]
+        (px1, py1), (px2, py2) = roi
+        return gray[int(py1 * h):int(py2 * h), int(px1 * w):int(px2 * w)]
+
+    def get_or_compute(self, img, name, compute, roi=None):
+        """
+        img 在 roi 内未变化且已有名为 name 的结果则直接返回，否则调用 compute() 识别并缓存
+        img 不是 ndarray（如图片路径）时不做门控
+        """
+        if not isinstance(img, np.ndarray):
+            return compute()
+        crop = self.crop(img, roi)
+        ref = self._refs.get(name)
+        if ref is not None and ref[0] == roi and ref[1].shape == crop.shape \
+                and int(cv2.absdiff(crop, ref[1]).max()) <= self.tolerance:
+            self.hits += 1
+            return ref[2]
+        self.misses += 1
+        result = compute()
+        # 截图缓冲区会被复用，区域要拷贝一份
+        self._refs[name] = (roi, crop.copy(), result)
+        return result
+
+    def invalidate(self):
+        self._refs = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def report(self, title=""):
+        s = self.stats()
+        print(f"🧊 画面复用{title}: 命中 {s['hits']} / {s['hits'] + s['misses']} ({s['hit_rate']:.0%})")
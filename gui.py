@@ -1,10 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pygetwindow as gw
 import os
 import win32gui
 from PIL import ImageGrab 
 from controller import GameController
+from window_registry import registry
 
 class FishingVillageGUI:
     def __init__(self, root):
@@ -176,10 +176,10 @@ class FishingVillageGUI:
         for item in sel:
             hwnd = int(self.tree.item(item, "values")[2])
             
-            if win32gui.IsWindow(hwnd):
+            geo = registry.geometry(hwnd)
+            if geo is not None:
                 # 获取当前窗口位置 (x, y)
-                rect = win32gui.GetWindowRect(hwnd)
-                curr_x, curr_y = rect[0], rect[1]
+                curr_x, curr_y = geo.left, geo.top
 
                 # 调整窗口大小
                 # SWP_NOMOVE: 保持当前位置
@@ -191,6 +191,7 @@ class FishingVillageGUI:
                     curr_x, curr_y, target_w, target_h, 
                     win32con.SWP_NOMOVE | win32con.SWP_NOZORDER
                 )
+                registry.moved(hwnd)
                 success_count += 1
         
         print(f"✅ 已同步 {success_count} 个窗口的大小")
@@ -221,14 +222,17 @@ class FishingVillageGUI:
 
         # 2. 截图操作
         try:
-            if win32gui.IsWindow(hwnd):
+            # geometry 每次实际读取窗口位置（GetWindowRect），窗口已关闭为 None
+            geo = registry.geometry(hwnd)
+            if geo is not None:
                 # 弹出并置顶
                 self.ctrl.force_focus(hwnd) 
                 self.root.after(200) # 等待 200ms 确保窗口完全渲染出来
                 
-                # 获取坐标并截图
-                rect = win32gui.GetWindowRect(hwnd)
-                img = ImageGrab.grab(bbox=rect)
+                # 获取坐标并截图（弹出后位置可能变化，重新读取）
+                geo = registry.geometry(hwnd)
+            if geo is not None:
+                img = ImageGrab.grab(bbox=(geo.left, geo.top, geo.left + geo.width, geo.top + geo.height))
                 img.save(file_path)
                 print(f"✅ 截图已保存: {file_path}")
             else:
@@ -240,7 +244,8 @@ class FishingVillageGUI:
     def refresh_list(self):
         self.tree.delete(*self.tree.get_children())
         self.hwnd_to_item = {}
-        windows = [w for w in gw.getAllWindows() if w.title == "幸福小渔村"]
+        registry.refresh()  # 手动刷新：重新枚举窗口
+        windows = registry.by_title("幸福小渔村", exact=True)
         for i, win in enumerate(windows):
             item_id = self.tree.insert("", "end", values=(i+1, win.title, win._hWnd, "已就绪"))
             self.hwnd_to_item[win._hWnd] = item_id
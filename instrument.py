@@ -0,0 +1,190 @@
+"""
+调用耗时统计：截图、模板匹配、OCR、检测、点击、等待等操作按窗口分别计数并记录延迟直方图
+
+- 默认关闭，关闭时被包装的函数只多一次布尔判断；环境变量 FISH_PROFILE=1 或 enable() 打开
+- 窗口取调用对象的 app_name（Operator），否则取当前线程 with window(...) 设置的窗口
+- stats() 进程内查询，report() 打印，dump(path) 导出 JSON
+
+用法：
+    @instrument.timed("capture")
+    def capture(self, ...): ...
+
+    with instrument.window(hwnd):
+        task.run()
+    instrument.sleep(0.5)      # 代替 time.sleep，计入 "sleep"
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+from pathlib import Path
+
+# 直方图桶上界（毫秒），最后一个桶收纳所有更慢的调用
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+_enabled = os.environ.get("FISH_PROFILE", "") not in ("", "0")
+_lock = threading.Lock()
+_local = threading.local()
+_data = {}  # {窗口: {操作: _Stat}}
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.hist = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, dt):
+        self.count += 1
+        self.total += dt
+        self.max = max(self.max, dt)
+        self.hist[bisect.bisect_left(BUCKETS_MS, dt * 1000)] += 1
+
+    def percentile(self, q):
+        """按直方图估计分位数（取所在桶的上界，最慢桶取实际最大值），单位秒"""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if n and seen >= target:
+                return BUCKETS_MS[i] / 1000 if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max * 1000,
+            "hist": {("≤%dms" % b if i < len(BUCKETS_MS) else ">%dms" % BUCKETS_MS[-1]): n
+                     for i, (b, n) in enumerate(zip(BUCKETS_MS + [None], self.hist)) if n},
+        }
+
+
+# ==================== 开关 ====================
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _data.clear()
+
+
+# ==================== 记录 ====================
+
+def current_window():
+    return getattr(_local, "window", None)
+
+
+@contextmanager
+def window(name):
+    """当前线程内的调用记到窗口 name 下"""
+    prev = current_window()
+    _local.window = name
+    try:
+        yield
+    finally:
+        _local.window = prev
+
+
+def record(op, dt, window=None):
+    win = str(window if window is not None else current_window())
+    with _lock:
+        ops = _data.setdefault(win, {})
+        stat = ops.get(op)
+        if stat is None:
+            stat = ops[op] = _Stat()
+        stat.add(dt)
+
+
+@contextmanager
+def span(op, window=None):
+    """计时一段代码"""
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(op, time.perf_counter() - t0, window)
+
+
+def timed(op):
+    """
+    装饰器：计时函数/方法调用
+    方法所属对象有 app_name 属性（如 Operator）时按该窗口记录
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            win = getattr(args[0], "app_name", None) if args else None
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(op, time.perf_counter() - t0, win)
+        return wrapper
+    return deco
+
+
+def sleep(seconds, window=None):
+    """time.sleep 并计入 "sleep"（看清楚时间有多少花在固定等待上）"""
+    if not _enabled:
+        time.sleep(seconds)
+        return
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    record("sleep", time.perf_counter() - t0, window)
+
+
+# ==================== 查询 / 导出 ====================
+
+def stats(window=None):
+    """
+    返回 {窗口: {操作: {count, total_s, mean_ms, p50_ms, p95_ms, max_ms, hist}}}
+    指定 window 时只返回该窗口的 {操作: ...}
+    """
+    with _lock:
+        result = {win: {op: s.to_dict() for op, s in ops.items()} for win, ops in _data.items()}
+    return result.get(str(window), {}) if window is not None else result
+
+
+def report(window=None):
+    data = stats()
+    if window is not None:
+        data = {str(window): data.get(str(window), {})}
+    for win, ops in data.items():
+        # 有 "run"（整轮任务）时以它为总耗时，各操作占比即其在任务墙钟时间中的份额
+        wall = ops["run"]["total_s"] if "run" in ops else sum(s["total_s"] for s in ops.values())
+        print(f"⏱️ 耗时统计 [窗口 {win}]（合计 {wall:.1f}s）:")
+        for op, s in sorted(ops.items(), key=lambda kv: -kv[1]["total_s"]):
+            share = s["total_s"] / wall if wall else 0.0
+            print(f"   {op:<10} {s['count']:>6} 次  合计 {s['total_s']:7.2f}s ({share:4.0%})  "
+                  f"p50 {s['p50_ms']:7.1f}ms  p95 {s['p95_ms']:7.1f}ms")
+
+
+def dump(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "windows": stats()},
+                  f, ensure_ascii=False, indent=2)
+    print(f"💾 耗时统计已保存: {path}")
@@ -1,8 +1,27 @@
+import startup  # 最先导入，作为启动计时起点
 import time
-import pygetwindow as gw
+from window_registry import registry
+import instrument
+from engine import engine
 from tasks.transport import TransportTask
+startup.mark("imports")
 
-windows = gw.getWindowsWithTitle("幸福小渔村")
+WARM_UP = True  # 首轮导航的同时在后台预加载 YOLO / OCR 模型
+PROFILE = False  # 统计各窗口截图/匹配/OCR/检测/点击/等待耗时，每轮写入 TIMING_FILE（也可设环境变量 FISH_PROFILE=1）
+TIMING_FILE = "logs/timing.json"
+STREAM_FPS = None  # 后台连续截图帧率（如 10），None 为每次识别时同步截图
+DETECTOR_BACKEND = "auto"  # 检测后端: "auto" / "torch" / "onnx" / "dnn"
+PYRAMID_LEVELS = 0  # 模板匹配金字塔层数，0 为全分辨率匹配
+MATCHER = "auto"  # 模板匹配后端: "auto" / "opencv" / "fft" / "sad"
+DEBUG_DUMP = None  # 调试：保存送进 YOLO 的帧的目录（如 "logs/frames"），None 不保存
+
+if PROFILE:
+    instrument.enable()
+# 所有窗口共用的 MyVision 在创建第一个任务时按这些参数创建
+engine.configure(detector_backend=DETECTOR_BACKEND, pyramid_levels=PYRAMID_LEVELS,
+                 matcher=MATCHER, debug_dump=DEBUG_DUMP)
+
+windows = registry.by_title("幸福小渔村")
 if not windows:
     print("未找到任何窗口，退出")
     exit()
@@ -12,6 +31,7 @@ def safe_activate(w):
     try:
         if w.isMinimized:
             w.restore()
+            registry.moved(w._hWnd)
             time.sleep(0.3)
         w.activate()
         time.sleep(0.3)
@@ -30,8 +50,12 @@ def safe_activate(w):
 window_tasks = []
 for w in windows:
     print(f"初始化窗口: {w.title}, 句柄: {w._hWnd}")
-    task = TransportTask(app_name=w._hWnd)
+    task = TransportTask(app_name=w._hWnd, stream_fps=STREAM_FPS)
     window_tasks.append((w, task))
+startup.mark("tasks_ready")
+
+if WARM_UP:
+    engine.warm_up()  # 所有窗口共用一份模型，只需预热一次
 
 max_rounds = 500
 for round_num in range(max_rounds):
@@ -49,5 +73,8 @@ for round_num in range(max_rounds):
         except Exception as e:
             print(f"❌ 任务出错: {e}")
 
+    if instrument.enabled():
+        instrument.dump(TIMING_FILE)
+
     print(f"\n⏳ 第 {round_num + 1} 轮完成，等待10秒...")
     time.sleep(30)
\ No newline at end of file
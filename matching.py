@@ -0,0 +1,180 @@
+"""
+模板匹配引擎：find_image / classify 只管在哪找、找哪个模板，具体怎么算分交给这里的后端
+
+- opencv: cv2.matchTemplate TM_CCOEFF_NORMED（原实现）
+- fft:    频域互相关实现的 TM_CCOEFF_NORMED（三通道分别去均值，分母用积分图），大模板时计算量与模板大小无关
+- sad:    灰度 SAD 定位 + 逐级剔除（分块和之差是 SAD 的下界，下界已超过当前最优的位置直接跳过），
+          定位后在该位置算一次 TM_CCOEFF_NORMED 作为分数，阈值含义与 opencv 一致
+
+所有后端返回 (分数, 左上角位置)，分数都是 TM_CCOEFF_NORMED 口径，0.8 阈值通用；出错或模板比大图大时分数为 -1
+
+后端选择（MatchEngine.select）:
+    1. tasks/matchers.json 中按模板 key 指定，如 {"tasks/pop-states/guanbi": "sad"}
+    2. MyVision(matcher=...) 指定 opencv/fft/sad 时全部用该后端
+    3. auto: 按模板面积，小图标 ≤ SAD_MAX_AREA 用 sad，≥ FFT_MIN_AREA 用 fft，其余 opencv
+"""
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent
+MATCHER_CONFIG = PROJECT_ROOT / "tasks" / "matchers.json"
+
+# auto 模式的面积阈值（像素），依据 python vision_bench.py matcher 在本项目模板上的测量结果：
+# - 局部窗口（状态识别的主要路径）里 opencv 在各档都最快，只有面积 ≤1000 的小图标 sad 更快（15ms vs 25ms）
+# - 全图搜索 sad 快 2 倍，但对有亮度偏移的小模板会漏检（≤2500 档约 7%），fft 各档都比 opencv 慢
+#   （cv2.matchTemplate 对大模板内部已走 DFT）
+# 因此默认都用 opencv（SAD_MAX_AREA=0 / FFT_MIN_AREA=None 即关闭），个别模板可在 matchers.json 中指定
+SAD_MAX_AREA = 0
+FFT_MIN_AREA = None
+
+
+class OpenCVMatcher:
+    name = "opencv"
+
+    def match(self, roi, tpl):
+        if tpl.shape[0] > roi.shape[0] or tpl.shape[1] > roi.shape[1]:
+            return -1.0, (0, 0)
+        try:
+            res = cv2.matchTemplate(roi, tpl, cv2.TM_CCOEFF_NORMED)
+            _, m_val, _, m_loc = cv2.minMaxLoc(res)
+            return m_val, m_loc
+        except Exception as e:
+            print(f"匹配过程中出错: {e}")
+            return -1.0, (0, 0)
+
+
+class FFTMatcher:
+    name = "fft"
+
+    def match(self, roi, tpl):
+        if tpl.shape[0] > roi.shape[0] or tpl.shape[1] > roi.shape[1]:
+            return -1.0, (0, 0)
+        img = roi.reshape(roi.shape[0], roi.shape[1], -1).astype(np.float64)
+        t = tpl.reshape(tpl.shape[0], tpl.shape[1], -1).astype(np.float64)
+        H, W, C = img.shape
+        h, w = t.shape[:2]
+        n = h * w
+        t = t - t.mean(axis=(0, 1))
+        t_norm2 = float((t * t).sum())
+
+        # 分子：各通道 I 与去均值模板的互相关之和（频域相乘后只做一次逆变换）
+        # 循环卷积尺寸 >= 大图即可保证有效区域不回绕
+        shape = (cv2.getOptimalDFTSize(H), cv2.getOptimalDFTSize(W))
+        spec = np.zeros((shape[0], shape[1] // 2 + 1), np.complex128)
+        for c in range(C):
+            spec += np.fft.rfft2(img[:, :, c], shape) * np.conj(np.fft.rfft2(t[:, :, c], shape))
+        num = np.fft.irfft2(spec, shape)[:H - h + 1, :W - w + 1]
+
+        # 分母：窗口内各通道方差之和，用积分图一次算出所有位置
+        s1, s2 = cv2.integral2(img if C > 1 else img[:, :, 0], sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        s1 = s1.reshape(H + 1, W + 1, -1)
+        s2 = s2.reshape(H + 1, W + 1, -1)
+
+        def window_sum(ii):
+            return ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+
+        ws1, ws2 = window_sum(s1), window_sum(s2)
+        var = (ws2 - ws1 * ws1 / n).sum(axis=2)
+        den = np.sqrt(np.maximum(var, 0) * t_norm2)
+        score = np.where(den > 1e-6, num / np.maximum(den, 1e-6), 0.0)
+        y, x = np.unravel_index(int(score.argmax()), score.shape)
+        return float(score[y, x]), (int(x), int(y))
+
+
+class SADMatcher:
+    """
+    灰度 SAD + 逐级剔除（successive elimination）：
+    模板和窗口都切成 grid×grid 块，Σ|块和之差| ≤ SAD，先用积分图一次算出所有位置的下界，
+    按下界从小到大精算 SAD，下界不小于当前最优 SAD 即停止；最多精算 max_candidates 个位置
+    """
+    name = "sad"
+
+    def __init__(self, grid=4, max_candidates=256):
+        self.grid = grid
+        self.max_candidates = max_candidates
+
+    @staticmethod
+    def _gray(img):
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    def match(self, roi, tpl):
+        if tpl.shape[0] > roi.shape[0] or tpl.shape[1] > roi.shape[1]:
+            return -1.0, (0, 0)
+        g8 = self._gray(roi)
+        ii = cv2.integral(g8, sdepth=cv2.CV_32S)
+        g = g8.astype(np.int32)
+        t = self._gray(tpl).astype(np.int32)
+        h, w = t.shape
+        P, Q = g.shape[0] - h + 1, g.shape[1] - w + 1
+
+        rows = np.linspace(0, h, min(self.grid, h) + 1).astype(int)
+        cols = np.linspace(0, w, min(self.grid, w) + 1).astype(int)
+        bound = np.zeros((P, Q), np.int64)
+        for r0, r1 in zip(rows[:-1], rows[1:]):
+            for c0, c1 in zip(cols[:-1], cols[1:]):
+                block = (ii[r1:r1 + P, c1:c1 + Q] - ii[r0:r0 + P, c1:c1 + Q]
+                         - ii[r1:r1 + P, c0:c0 + Q] + ii[r0:r0 + P, c0:c0 + Q])
+                bound += np.abs(block - int(t[r0:r1, c0:c1].sum()))
+
+        flat = bound.ravel()
+        k = min(self.max_candidates, flat.size)
+        cand = np.argpartition(flat, k - 1)[:k] if k < flat.size else np.arange(flat.size)
+        cand = cand[np.argsort(flat[cand], kind="stable")]
+
+        best, best_idx = None, int(cand[0])
+        for idx in cand:
+            if best is not None and flat[idx] >= best:
+                break  # 剩下位置的下界都不小于当前最优，不可能更好
+            y, x = divmod(int(idx), Q)
+            sad = int(np.abs(g[y:y + h, x:x + w] - t).sum())
+            if best is None or sad < best:
+                best, best_idx = sad, int(idx)
+
+        y, x = divmod(best_idx, Q)
+        # 定位后只在这一个位置算 TM_CCOEFF_NORMED，分数与 opencv 后端同口径
+        res = cv2.matchTemplate(roi[y:y + h, x:x + w], tpl, cv2.TM_CCOEFF_NORMED)
+        return float(res[0, 0]), (x, y)
+
+
+MATCHERS = {m.name: m for m in (OpenCVMatcher, FFTMatcher, SADMatcher)}
+
+
+class MatchEngine:
+    def __init__(self, default="auto", config_path=MATCHER_CONFIG):
+        if default != "auto" and default not in MATCHERS:
+            raise ValueError(f"未知匹配后端: {default}，可选 auto/{'/'.join(MATCHERS)}")
+        self.default = default
+        self.backends = {name: cls() for name, cls in MATCHERS.items()}
+        self.opencv = self.backends["opencv"]
+        self.overrides = self._load_config(config_path)
+
+    @staticmethod
+    def _load_config(path):
+        path = Path(path)
+        if not path.exists():
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        bad = {k: v for k, v in overrides.items() if v not in MATCHERS}
+        if bad:
+            print(f"⚠️ {path.name} 中有未知匹配后端，已忽略: {bad}")
+        return {k: v for k, v in overrides.items() if v in MATCHERS}
+
+    def select(self, tpl, key=None):
+        """为模板选择后端：配置文件 > 全局指定 > 按面积自动"""
+        name = self.overrides.get(key) if key is not None else None
+        if name is None:
+            name = self.default if self.default != "auto" else self.auto_backend(tpl)
+        return self.backends[name]
+
+    @staticmethod
+    def auto_backend(tpl):
+        area = tpl.shape[0] * tpl.shape[1]
+        if area <= SAD_MAX_AREA:
+            return "sad"
+        if FFT_MIN_AREA is not None and area >= FFT_MIN_AREA:
+            return "fft"
+        return "opencv"
@@ -1,28 +1,21 @@
 import numpy as np
-import pyautogui
 import random
 import time
 import os
-import pygetwindow as gw
-import json
 from pathlib import Path
-from PIL import Image
-from coordinate_utils import CoordinateConverter
 import cv2
+import startup
+import instrument
+from capture import create_capture, CaptureWorker
+from window_registry import registry
+from coordinate_utils import WindowGeometry
+from annotations import annotations
+# pyautogui / pygetwindow 需要桌面环境，用到时才导入（回放模式可在无桌面的 Linux 上运行）
 # ==================== 工具函数更新 ====================
 
 def get_target_window(app_name_or_id):
-    """辅助函数：获取窗口对象，支持名称(str)或句柄(int)"""
-    if isinstance(app_name_or_id, str):
-        windows = gw.getWindowsWithTitle(app_name_or_id)
-        return windows[0] if windows else None
-    elif isinstance(app_name_or_id, int):
-        # ✅ 修复：pygetwindow 不支持 gw.Window(hwnd)
-        # 必须遍历所有窗口，通过句柄匹配
-        for w in gw.getAllWindows():
-            if w._hWnd == app_name_or_id:
-                return w
-        return None
+    """辅助函数：获取窗口对象，支持名称(str)或句柄(int)；通过窗口注册表查询，不再每次枚举所有窗口"""
+    return registry.find(app_name_or_id)
 
 
 def random_duration(min_time, max_time, use_gauss=True):
@@ -56,18 +49,30 @@ def sample_point_in_box(box, sigma_ratio=0.1):
     return [np.clip(gx, x_min, x_max), np.clip(gy, y_min, y_max)]
 
 
+# 每个窗口的输入动作计数：同一窗口的多个 Operator（如 TransportTask 与 StateManager 各一个）共用，
+# 识别结果缓存以此为版本号，有过点击/拖动即失效
+_action_counts = {}
+
 # ==================== 封装类 ====================
 
 class Operator:
-    def __init__(self, app_name=None):
+    def __init__(self, app_name=None, capture="auto"):
         """
         Args:
             app_name: 窗口名称(str)或窗口ID(int)
+            capture: 截图后端，见 capture.create_capture（"auto" / "mss" / "pyautogui" / "replay:<目录或视频>"）
         """
         self.app_name = app_name
         self._window = None
-        
-        if app_name is not None:
+        self.capturer = create_capture(capture)
+        # 回放模式没有真实窗口：不绑定窗口，点击/拖动只打印
+        self.live = self.capturer.live
+        # 可选的后台连续截图（start_stream 开启），开启后 capture() 直接取最新帧
+        self.stream = None
+
+        if not self.live:
+            print(f"🎞️ 回放模式: {getattr(self.capturer, 'source', '')}")
+        elif app_name is not None:
             self._window = get_target_window(app_name)
             if self._window:
                 print(f"✅ 绑定窗口: {self._window.title} (ID: {self._window._hWnd})")
@@ -91,47 +96,46 @@ class Operator:
 
         coord_type = 'a_percentage' if is_percentage(box) else 'a_pixel'
 
-        converter = CoordinateConverter(box, coord_type=coord_type, obj=self._window.title)
-        return converter.s_pixel
+        # 按句柄取缓存的窗口换算（多开时同名窗口有多个），窗口位置没变就不重建
+        geometry = WindowGeometry.for_window(self._window._hWnd)
+        if geometry is None:
+            raise ValueError(f"窗口已关闭: {self.app_name}")
+        return geometry.convert(box, coord_type, 's_pixel').tolist()
 
+    @instrument.timed("capture")
     def capture(self, save_path=None, region=None):
         """
         截图功能：增加窗口自动弹出/置顶逻辑
+        返回 Frame（BGR ndarray 子类，灰度/RGB/ROI 等派生表示按需计算并缓存）
+        开启了后台截图（start_stream）且未指定 region 时，直接取点击之后的最新帧，不再同步截图
         """
+        if self.stream is not None and self.stream.running and region is None:
+            img = self.stream.latest(consumer=id(self))
+            if img is not None:
+                if save_path:
+                    self._save(img, save_path)
+                return img
         try:
-            # --- 新增：窗口弹出/激活逻辑 ---
+            # --- 新增：窗口弹出/激活逻辑（已在前台则跳过，省去 0.2 秒等待）---
             if self._window:
                 try:
                     if self._window.isMinimized:
                         self._window.restore()  # 如果最小化了，先恢复
-                    self._window.activate()     # 将窗口带到前台
-                    time.sleep(0.2)             # 等待窗口渲染/弹出动画完成
+                        registry.moved(self._window._hWnd)
+                    if not self._window.isActive:
+                        self._window.activate()     # 将窗口带到前台
+                        time.sleep(0.2)             # 等待窗口渲染/弹出动画完成
                 except Exception as e:
                     print(f"⚠️ 无法弹出窗口: {e}")
 
-            # 确定截图范围
-            capture_region = None
-            if region:
-                x1, y1, x2, y2 = region
-                capture_region = (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
-            elif self._window:
-                # 重新获取最新的窗口位置（防止激活后位置变动）
-                capture_region = (
-                    self._window.left, 
-                    self._window.top, 
-                    self._window.width, 
-                    self._window.height
-                )
+            capture_region = self._capture_region(region)
 
             # 执行截图
-            img = pyautogui.screenshot(region=capture_region)
-            img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+            img = self.capturer.grab(capture_region)
+            if img is None:
+                return None
             if save_path:
-                folder = os.path.dirname(save_path)
-                if folder and not os.path.exists(folder):
-                    os.makedirs(folder)
-                cv2.imwrite(save_path, img)
-                print(f"📸 截图已保存至: {save_path}")
+                self._save(img, save_path)
             
             return img
 
@@ -139,32 +143,87 @@ class Operator:
             print(f"❌ 截图失败: {e}")
             return None
 
+    def _capture_region(self, region=None):
+        """截图范围 (left, top, width, height)：指定 region (x1, y1, x2, y2) 或当前窗口位置，都没有为全屏"""
+        if region:
+            x1, y1, x2, y2 = region
+            return (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
+        if self._window:
+            # 重新获取最新的窗口位置（防止激活后位置变动），一次 GetWindowRect
+            geo = registry.geometry(self._window._hWnd)
+            return tuple(geo) if geo else None
+        return None
+
+    @staticmethod
+    def _save(img, save_path):
+        folder = os.path.dirname(save_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        cv2.imwrite(save_path, img)
+        print(f"📸 截图已保存至: {save_path}")
+
+    def start_stream(self, fps=10, size=4, worker=None):
+        """
+        开启后台连续截图：截图不再阻塞识别流程；worker 传入已有的 CaptureWorker 可与其他 Operator 共用
+        （每个 Operator 各占一个槽位，共用时 size 至少为 Operator 数 + 2）
+        窗口需保持在前台且不被遮挡（后台线程不会激活窗口）
+        """
+        if worker is None:
+            worker = CaptureWorker(self.capturer, self._capture_region, fps=fps, size=size)
+        self.stream = worker.start()
+        return self.stream
+
+    def stop_stream(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+
+    @property
+    def action_count(self):
+        """本窗口累计的输入动作次数"""
+        return _action_counts.get(self.app_name, 0)
+
+    def _after_action(self):
+        """输入动作之后：识别缓存失效，后台截图需等到动作之后的新帧"""
+        _action_counts[self.app_name] = _action_counts.get(self.app_name, 0) + 1
+        if self.stream is not None:
+            self.stream.mark_action()
+
+    @instrument.timed("click")
     def click(self, box):
+        if not self.live:
+            print(f"🖱️ (回放) 点击: {box}")
+            self._after_action()  # 回放也视为一次动作，之后的识别用新帧
+            return
+        import pyautogui
         abs_box = self.transform_box(box)
         gx, gy = sample_point_in_box(abs_box)
         duration = random_duration(0.1, 0.2)
         pyautogui.moveTo(gx, gy, duration=duration)
         pyautogui.click()
+        self._after_action()
+        startup.mark("first_action")
         print(f"🖱️ 点击: ({gx:.0f}, {gy:.0f})")
 
     def click_json(self, path):
         """输入图片名或json名，读取labelme格式的矩形区域并点击"""
-        p = Path(path)
-        if p.suffix.lower() in {".png", ".jpg", ".jpeg"}:
-            p = p.with_suffix(".json")
-        elif p.suffix == "":
-            p = p.with_suffix(".json")
-
-        data = json.load(open(p))
-
-        # 提取第一个矩形区域的 points（labelme标准格式）
-        box = data["shapes"][0]["points"]
+        # 标注已在内存中（JSON 变动时自动重新读取），取第一个矩形区域
+        ann = annotations.get(path)
+        if ann is None:
+            raise FileNotFoundError(f"找不到标注: {Path(path).with_suffix('.json')}")
+        box = ann.box
         print(f"点击box{box}")
         print(f"   🖱️ 点击: {Path(path).stem}")
         self.click(box)
         return True
 
+    @instrument.timed("click")
     def double_click(self, box):
+        if not self.live:
+            print(f"🖱️ (回放) 双击: {box}")
+            self._after_action()  # 回放也视为一次动作，之后的识别用新帧
+            return
+        import pyautogui
         abs_box = self.transform_box(box)
         gx, gy = sample_point_in_box(abs_box)
         duration = random_duration(0.1, 0.2)
@@ -172,9 +231,16 @@ class Operator:
         pyautogui.click()
         time.sleep(random_duration(0.05, 0.1, False))
         pyautogui.click()
+        self._after_action()
         print(f"🖱️ 双击: ({gx:.0f}, {gy:.0f})")
 
+    @instrument.timed("drag")
     def drag(self, box, direction, duration=0.5, reback=False):
+        if not self.live:
+            print(f"↔️ (回放) 拖动 {direction}: {box}")
+            self._after_action()  # 回放也视为一次动作，之后的识别用新帧
+            return
+        import pyautogui
         abs_box = self.transform_box(box)
         x1, y1 = abs_box[0]
         x2, y2 = abs_box[1]
@@ -207,10 +273,12 @@ class Operator:
         if reback:
             pyautogui.moveTo(x1 + 5, start_y, duration=0.2)
             pyautogui.dragTo(end_x, start_y, duration=duration, button='left')
+            self._after_action()
             return
 
         pyautogui.moveTo(start_x, start_y, duration=0.2)
         pyautogui.dragTo(end_x, end_y, duration=duration, button='left', tween=pyautogui.easeInOutQuad)
+        self._after_action()
         print(f"↔️ 拖动 {direction}: ({start_x:.0f},{start_y:.0f}) -> ({end_x:.0f},{end_y:.0f})")
 
 
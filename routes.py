@@ -0,0 +1,144 @@
+"""
+导航路由表：page-change 图编译成全源最短路的下一跳表，边权为实测的跳转代价
+
+- 边权 = 期望耗时 = 平均成功耗时 / 成功率（均带先验：没测过的边平均 1s、成功率 1/2，即所有边代价相同，退化为原来的 BFS）
+- 同一对页面在 states.txt 中声明为等效的跳转（page-change-alt）保留为备选，按实测成功率排序，边权取其中最小的
+- record() 记录导航发起的跳转的结果和耗时，写入 logs/transitions.json，下次运行接着用；权重变化后下次查询时重新编译
+- 页面只有二十几个，Floyd–Warshall 用 NumPy 按中转点逐行更新，编译一次不到 1ms
+
+用法：
+    routes = RouteTable({"zhuye": {"lingdi": ["zhuye_lingdi_01"]}, ...})
+    routes.path("zhuye", "lingdi")                 # ["zhuye", "lingdi"]
+    routes.alternatives("zhuye", "lingdi")         # ["zhuye_lingdi_01"]（有等效跳转时按成功率排序）
+    routes.record("zhuye_lingdi_01", ok=True, seconds=0.8)
+"""
+import os
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent
+STATS_FILE = PROJECT_ROOT / "logs" / "transitions.json"
+PRIOR_SECONDS = 1.0  # 没测过的跳转按 1 次成功、耗时 1s 计
+PRIOR_FAILS = 1      # 以及 1 次失败
+
+
+class RouteTable:
+    def __init__(self, edges, stats_path=STATS_FILE):
+        """edges: {起点: {终点: [跳转 key, ...]}}"""
+        self.edges = edges
+        self.stats_path = Path(stats_path) if stats_path else None
+        self.stats = {}  # 跳转 key → {"count", "ok", "seconds"}（seconds 为成功跳转的总耗时）
+        self.nodes = sorted(set(edges) | {t for targets in edges.values() for t in targets})
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        self._lock = threading.Lock()
+        self._dist = None
+        self._next = None
+        self._load()
+
+    # ==================== 代价 ====================
+    def _stat(self, key):
+        return self.stats.get(key, {"count": 0, "ok": 0, "seconds": 0.0})
+
+    def success_rate(self, key):
+        s = self._stat(key)
+        return (s["ok"] + 1) / (s["count"] + 1 + PRIOR_FAILS)
+
+    def cost(self, key):
+        """期望耗时：平均成功耗时 / 成功率"""
+        s = self._stat(key)
+        latency = (s["seconds"] + PRIOR_SECONDS) / (s["ok"] + 1)
+        return latency / self.success_rate(key)
+
+    def alternatives(self, start, end):
+        """start → end 的所有跳转 key，成功率高的在前（相同时耗时短的在前），没有直达边返回 []"""
+        keys = self.edges.get(start, {}).get(end, [])
+        return sorted(keys, key=lambda k: (-self.success_rate(k), self.cost(k)))
+
+    # ==================== 编译 ====================
+    def _compile(self):
+        n = len(self.nodes)
+        dist = np.full((n, n), np.inf)
+        nxt = np.full((n, n), -1, dtype=np.int32)
+        np.fill_diagonal(dist, 0.0)
+        for i in range(n):
+            nxt[i, i] = i
+        for start, targets in self.edges.items():
+            for end, keys in targets.items():
+                u, v = self.index[start], self.index[end]
+                w = min(self.cost(k) for k in keys)
+                if w < dist[u, v]:
+                    dist[u, v] = w
+                    nxt[u, v] = v
+        # Floyd–Warshall：经过中转点 k 更短时，下一跳改为去 k 的下一跳
+        for k in range(n):
+            via = dist[:, k:k + 1] + dist[k:k + 1, :]
+            better = via < dist
+            dist = np.where(better, via, dist)
+            nxt = np.where(better, nxt[:, k:k + 1], nxt)
+        self._dist, self._next = dist, nxt
+
+    def _table(self):
+        with self._lock:
+            if self._next is None:
+                self._compile()
+            return self._dist, self._next
+
+    # ==================== 查询 ====================
+    def path(self, start, end):
+        """代价最小的路径 [start, ..., end]，不可达返回 None"""
+        if start not in self.index or end not in self.index:
+            return None
+        dist, nxt = self._table()
+        u, v = self.index[start], self.index[end]
+        if nxt[u, v] < 0:
+            return None
+        path = [start]
+        while u != v:
+            u = int(nxt[u, v])
+            path.append(self.nodes[u])
+        return path
+
+    def distance(self, start, end):
+        """最短路径的期望耗时（秒），不可达为 inf"""
+        if start not in self.index or end not in self.index:
+            return float("inf")
+        dist, _ = self._table()
+        return float(dist[self.index[start], self.index[end]])
+
+    # ==================== 学习 ====================
+    def record(self, key, ok, seconds):
+        """记录一次跳转：ok 是否到达，seconds 从第一次点击到到达（或放弃）的耗时"""
+        with self._lock:
+            s = self.stats.setdefault(key, {"count": 0, "ok": 0, "seconds": 0.0})
+            s["count"] += 1
+            if ok:
+                s["ok"] += 1
+                s["seconds"] += seconds
+            self._next = None  # 权重变了，下次查询重新编译
+        self.save()
+
+    def _load(self):
+        if self.stats_path is None or not self.stats_path.exists():
+            return
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                self.stats = json.load(f).get("edges", {})
+        except Exception as e:
+            print(f"⚠️ 跳转统计读取失败 {self.stats_path}: {e}")
+
+    def save(self):
+        if self.stats_path is None:
+            return
+        with self._lock:
+            data = {"edges": {k: dict(v) for k, v in sorted(self.stats.items())}}
+            try:
+                self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.stats_path.with_suffix(".tmp")
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.stats_path)  # 先写临时文件再替换，中途退出不会留下半个文件
+            except OSError as e:
+                print(f"⚠️ 跳转统计保存失败 {self.stats_path}: {e}")
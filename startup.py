@@ -0,0 +1,22 @@
+"""
+启动耗时记录：入口脚本最先 import 本模块作为计时起点，
+各阶段调用 mark()，第一次真正操作（点击）时自动打印启动报告
+"""
+import time
+
+T0 = time.perf_counter()
+_marks = {}
+
+
+def mark(name):
+    """记录某阶段距启动的耗时（同名只记第一次）"""
+    if name not in _marks:
+        _marks[name] = time.perf_counter() - T0
+        if name == "first_action":
+            report()
+
+
+def report():
+    print("⏱️ 启动报告:")
+    for name, t in sorted(_marks.items(), key=lambda kv: kv[1]):
+        print(f"   {name:<16} {t:7.2f}s")
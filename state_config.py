@@ -0,0 +1,129 @@
+"""
+states.txt 编译结果：各节配置、弹窗/页面检测顺序、导航图、模板 key 表
+
+只读，进程内每个 states.txt 一份（见 engine.state_config），所有窗口的 StateManager 共用
+（routes 的跳转统计会随运行更新，内部加锁）
+"""
+from pathlib import Path
+
+from routes import RouteTable
+
+
+class StateConfig:
+    def __init__(self, states_file, templates):
+        self.path = Path(states_file).resolve()
+        self.base_dir = self.path.parent.parent
+        self.templates = templates
+        self.pop_order = []      # 弹窗检测顺序（优先检测）
+        self.page_order = []     # 页面检测顺序
+        self.config = self._parse(self.path)
+        # 模板 key → (类型, 状态名)，按 弹窗优先 的顺序排列，供批量识别使用
+        self.state_keys = self._build_state_keys()
+        # 仅用 page-change 构建导航图（pop 不参与导航）
+        self.edges = self._build_edges()
+        # 按实测跳转代价的最短路下一跳表
+        self.routes = RouteTable(self.edges)
+
+    # ==================== 解析 ====================
+    def _parse(self, file_path):
+        """
+        解析 states.txt，按节分类：
+          pop-states / pop-change / page-states / page-change / page-change-alt
+        page-change-alt: 与同一对页面的 page-change 效果相同、可互相替代的跳转（如同一按钮的另一个位置）
+        """
+        config = {
+            "pop-states":  {},
+            "pop-change":  {},
+            "page-states": {},
+            "page-change": {},
+            "page-change-alt": {},
+        }
+
+        if not file_path.exists():
+            print(f"❌ 找不到配置文件: {file_path}")
+            return config
+
+        current_section = None
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                raw = line.strip()
+
+                # 识别节标记
+                if raw.startswith("#"):
+                    tag = raw.lstrip("#").strip()
+                    if tag in config:
+                        current_section = tag
+                    continue
+
+                # 去掉行内注释
+                line_clean = raw.split('#')[0].strip()
+                if not line_clean or '=' not in line_clean:
+                    continue
+
+                key, val = [x.strip() for x in line_clean.split('=', 1)]
+                val = val.strip('"')
+
+                if current_section and current_section in config:
+                    config[current_section][key] = val
+
+                    if current_section == "pop-states":
+                        self.pop_order.append(key)
+                    elif current_section == "page-states":
+                        self.page_order.append(key)
+        return config
+
+    # ==================== 导航图 ====================
+    def _build_edges(self):
+        """
+        仅用 page-change 构建导航图，pop 不参与：{起点: {终点: [跳转 key, ...]}}
+        同一对页面的 _01/_02... 往往是不同的按钮（如 shangzhen_lingdi_01 取消、_02 确定上阵），
+        导航只用序号最小的那个；page-change-alt 中声明为等效的跳转才作为备选追加在后面
+        """
+        edges = {}
+        for section in ("page-change", "page-change-alt"):
+            for key in sorted(self.config[section]):
+                parts = key.split('_')
+                if len(parts) >= 3:
+                    keys = edges.setdefault(parts[0], {}).setdefault(parts[1], [])
+                    if section == "page-change-alt" or not keys:
+                        keys.append(key)
+        return edges
+
+    def change_section(self, key):
+        """跳转 key 所在的节（page-change / page-change-alt），不存在返回 None"""
+        for section in ("page-change", "page-change-alt"):
+            if key in self.config[section]:
+                return section
+        return None
+
+    # ==================== 模板 ====================
+    def template_key(self, section, name, warn=False):
+        """
+        状态名 → 模板库 key（即 states.txt 中的路径），模板不存在返回 None
+        """
+        img_path = Path(self.config[section][name]).with_suffix(".png")
+        if not img_path.is_absolute():
+            img_path = self.base_dir / img_path
+        if self.templates.get(img_path) is None:
+            if warn:
+                print(f"⚠️ 找不到状态图片: {img_path}")
+            return None
+        return self.templates.key_of(img_path)
+
+    def _build_state_keys(self):
+        state_keys = {}
+        for kind, section, order in (("pop", "pop-states", self.pop_order),
+                                     ("page", "page-states", self.page_order)):
+            for name in order:
+                key = self.template_key(section, name, warn=(kind == "page"))
+                if key is not None:
+                    state_keys[key] = (kind, name)
+        return state_keys
+
+    def change_path(self, section, key):
+        """pop-change / page-change 的点击标注路径（.json，绝对路径）"""
+        json_path = Path(self.config[section][key]).with_suffix(".json")
+        if not json_path.is_absolute():
+            json_path = self.base_dir / json_path
+        return json_path
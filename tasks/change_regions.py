@@ -4,15 +4,16 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 import operate
-import vision
+from engine import engine
 from tasks.get_states import StateManager
+from tasks.id_index import IDIndex
 
 
 
 windows = operate.Operator.get_all_windows()
 
 print(windows)
-V = vision.MyVision(yolo_model_path="models/best.pt")
+V = engine.vision("models/best.pt")
 
 img = operate.Operator(app_name="幸福小渔村").capture()
 def detect_num(img,limit_img):
@@ -26,17 +27,16 @@ climit_img2 = "tasks/change-regions/shezhi_02.png"
 mgr = StateManager("tasks/states.txt", app_name="幸福小渔村")
 mgr.navigate_to("shezhi")
 current_region = [detect_num(img,climit_img1),detect_num(img,climit_img2)]
-def detect_id(img,filter_path):
-    for i in Path(filter_path).glob("*.png"):
-        a = V.find_image(img, i, a_percentage=None)
-        if a:
-            return i.stem
+# ID 图库索引：最近邻查询 + 一次校验匹配，结果附带 IDdata.csv 中的区服
+id_index = IDIndex(V, gallery="tasks/change-regions/ID")
+def detect_id(img):
+    found = id_index.lookup(img)
+    return found["id"] if found else None
 
-filter_path = "tasks/change-regions/ID/"
-current_id =  detect_id(img,filter_path)
+current_id =  detect_id(img)
 
 
 print("=="*30,"\n",
       current_region , "\n",
-      id
+      current_id, id_index.regions_of(current_id)
       )
\ No newline at end of file
@@ -1,130 +1,55 @@
 import sys
 import time
 from pathlib import Path
-from collections import deque
 
 sys.path.append(str(Path(__file__).parent.parent))
-import vision
 from operate import Operator
+from engine import engine
+from frame_gate import FrameGate
+import startup
+import waiting
 
 
 class StateManager:
-    def __init__(self, states_file, app_name=None, screenshot_path=None, yolo_model="models/best.pt"):
-        self.operator = Operator(app_name)
+    def __init__(self, states_file, app_name=None, screenshot_path=None, yolo_model="models/best.pt", capture="auto",
+                 obs_max_age=1.0):
+        # capture: 截图后端（见 capture.py），"replay:<目录>" 可在无桌面环境下回放录制的截图
+        self.operator = Operator(app_name, capture)
         self.screenshot_path = screenshot_path
 
-        self.states_file_path = Path(states_file).resolve()
-        self.base_dir = self.states_file_path.parent.parent
-
-        # 解析配置
-        self.states_config = self._parse_states(self.states_file_path)
-
-        # 初始化识别
-        self.v = vision.MyVision(yolo_model_path=yolo_model)
-        # 仅用 page-change 构建导航图（pop 不参与导航）
-        self.state_graph = self._build_graph()
-
-    # ==================== 解析 ====================
-    def _parse_states(self, file_path):
-        """
-        解析 states.txt，按节分类：
-          pop-states / pop-change / page-states / page-change
-        """
-        config = {
-            "pop-states":  {},
-            "pop-change":  {},
-            "page-states": {},
-            "page-change": {},
-        }
-        self.pop_order  = []     # 弹窗检测顺序（优先检测）
-        self.page_order = []     # 页面检测顺序
-
-        if not file_path.exists():
-            print(f"❌ 找不到配置文件: {file_path}")
-            return config
-
-        current_section = None
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                raw = line.strip()
-
-                # 识别节标记
-                if raw.startswith("#"):
-                    tag = raw.lstrip("#").strip()
-                    if tag in config:
-                        current_section = tag
-                    continue
-
-                # 去掉行内注释
-                line_clean = raw.split('#')[0].strip()
-                if not line_clean or '=' not in line_clean:
-                    continue
-
-                key, val = [x.strip() for x in line_clean.split('=', 1)]
-                val = val.strip('"')
-
-                if current_section and current_section in config:
-                    config[current_section][key] = val
-
-                    if current_section == "pop-states":
-                        self.pop_order.append(key)
-                    elif current_section == "page-states":
-                        self.page_order.append(key)
-
-        #print(f"📋 弹窗状态: {self.pop_order}")
-        #print(f"📋 页面状态: {self.page_order}")
-        #print(f"📋 弹窗关闭: {list(config['pop-change'].keys())}")
-        #print(f"📋 页面跳转: {list(config['page-change'].keys())}")
-        return config
-
-    # ==================== 导航图 ====================
-    def _build_graph(self):
-        """仅用 page-change 构建导航图，pop 不参与"""
-        graph = {}
-        for key in self.states_config["page-change"]:
-            parts = key.split('_')
-            if len(parts) >= 3:
-                from_state = parts[0]
-                to_state = parts[1]
-                if from_state not in graph:
-                    graph[from_state] = {}
-                if to_state not in graph[from_state]:
-                    graph[from_state][to_state] = key
-        #print(f"📊 导航图: {graph}")
-        return graph
+        # 识别资源与解析好的配置进程内共用（见 engine.py），每个窗口只持有引用
+        self.v = engine.vision(yolo_model)
+        self.config = engine.state_config(states_file, yolo_model)
+        self.states_file_path = self.config.path
+        self.base_dir = self.config.base_dir
+        self.states_config = self.config.config
+        self.pop_order = self.config.pop_order
+        self.page_order = self.config.page_order
+        # 模板 key → (类型, 状态名)，按 弹窗优先 的顺序排列，供批量识别使用
+        self.state_keys = self.config.state_keys
+        # 全源最短路下一跳表，边权为实测跳转代价（所有窗口共用，统计持久化到 logs/transitions.json）
+        self.routes = self.config.routes
+        # 画面没变化时复用上一次的识别结果
+        self.gate = FrameGate()
+        # 观察缓存：(动作版本, 识别时刻, 帧, 弹窗, 页面)，本窗口没有新的输入动作且不超过 obs_max_age 秒就直接复用，见 observe()
+        self._observation = None
+        self.obs_max_age = obs_max_age
+        self.obs_stats = {"hit": 0, "miss": 0}
 
     # ==================== 弹窗处理 ====================
-    def _check_popup(self, img_source):
-        """
-        检测是否有弹窗，有则返回弹窗名，无返回 None
-        """
-        for pop_name in self.pop_order:
-            base_path_str = self.states_config["pop-states"][pop_name]
-            img_path = Path(base_path_str).with_suffix(".png")
-            if not img_path.is_absolute():
-                img_path = self.base_dir / img_path
-            if not img_path.exists():
-                continue
-            res = self.v.find_image(img_source, str(img_path))
-            if res:
-                print(f"🔔 检测到弹窗: [{pop_name}]")
-                return pop_name
-        return None
-
     def _dismiss_popup(self, pop_name):
         """
         关闭弹窗：找到该弹窗对应的任意一个 pop-change，执行点击
         """
         # 找到 pop_name 开头的第一个 change
-        for key, val in self.states_config["pop-change"].items():
+        for key in self.states_config["pop-change"]:
             if key.startswith(pop_name + "_"):
-                json_path = Path(val).with_suffix(".json")
-                if not json_path.is_absolute():
-                    json_path = self.base_dir / json_path
+                json_path = self.config.change_path("pop-change", key)
                 print(f"  ❎ 关闭弹窗 [{pop_name}] → 点击 {json_path}")
                 self.operator.click_json(str(json_path))
-                time.sleep(0.5)
+                # 等弹窗消失（或换成另一层弹窗）
+                self.wait_for(lambda: self.observe(refresh=True)[0] != pop_name, timeout=2.0, budget=0.5,
+                              name=f"关闭{pop_name}")
                 return True
         print(f"  ⚠️ 未找到弹窗 [{pop_name}] 的关闭配置")
         return False
@@ -135,89 +60,152 @@ class StateManager:
         返回: True 清除成功（或无弹窗），False 无法清除
         """
         for i in range(max_attempts):
-            img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
-            pop = self._check_popup(img_source)
+            pop, _ = self.observe()
+            if pop:
+                print(f"🔔 检测到弹窗: [{pop}]")
             if pop is None:
                 return True
             print(f"  🔄 清除弹窗 (第 {i+1} 次)")
             if not self._dismiss_popup(pop):
                 return False
-            time.sleep(0.5)
         print("  ❌ 弹窗清除次数超限")
         return False
 
     # ==================== 状态识别 ====================
-    def get_states(self, auto_dismiss_popup=True):
+    def classify_states(self, img_source=None, kinds=("pop", "page")):
+        """
+        单次批量识别：一帧截图只准备一次，对所有弹窗/页面模板打分
+        返回按分数排序的列表: [{"type", "name", "score", "box", "matched"}, ...]
+        """
+        if img_source is None:
+            img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
+        return self.gate.get_or_compute(img_source, ("classify", tuple(kinds)),
+                                        lambda: self._classify_frame(img_source, kinds))
+
+    def _classify_frame(self, img_source, kinds):
+        keys = [k for k, (kind, _) in self.state_keys.items() if kind in kinds]
+        ranked = []
+        for r in self.v.classify(img_source, keys):
+            kind, name = self.state_keys[r["key"]]
+            ranked.append({"type": kind, "name": name, "score": r["score"],
+                           "box": r["box"], "matched": r["matched"]})
+        return ranked
+
+    def _classify(self, img_source, kinds=("pop", "page")):
+        """
+        返回 (已匹配的弹窗, 已匹配的页面)，没有则为 None
+        多个模板同时匹配时按 states.txt 中的顺序取第一个（如 caiji 等浮层页面排在 lingdi 之前，
+        浮层下面的 lingdi 分数可能更高），不按分数高低
+        """
+        matched = {(r["type"], r["name"]) for r in self.classify_states(img_source, kinds) if r["matched"]}
+        pop = page = None
+        for kind, name in self.state_keys.values():
+            if (kind, name) not in matched:
+                continue
+            if kind == "pop" and pop is None:
+                pop = name
+            elif kind == "page" and page is None:
+                page = name
+        return pop, page
+
+    def observe(self, refresh=False):
+        """
+        当前画面的 (已匹配的弹窗, 已匹配的页面)，不关闭弹窗
+        同一窗口上次观察之后没有点击/拖动、且结果不超过 obs_max_age 秒时直接复用（一帧截图只识别一次）；
+        超过 obs_max_age 重新识别，不会漏掉没有点击也会自己弹出的定时弹窗
+        refresh=True 强制重新截图识别（等待画面变化时）
+        """
+        version = self.operator.action_count
+        now = time.perf_counter()
+        cached = self._observation
+        if not refresh and cached is not None and cached[0] == version and now - cached[1] <= self.obs_max_age:
+            self.obs_stats["hit"] += 1
+            return cached[3], cached[4]
+        self.obs_stats["miss"] += 1
+        img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
+        pop, page = self._classify(img_source)
+        self._observation = (version, now, img_source, pop, page)
+        return pop, page
+
+    def refresh(self):
+        """丢弃观察缓存，下一次查询重新截图识别"""
+        self._observation = None
+
+    def get_states(self, auto_dismiss_popup=True, refresh=False):
         """
         获取当前状态：
         1. 先检查弹窗，自动关闭
         2. 再检查页面状态
         """
-        img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
+        pop, page = self.observe(refresh)
 
         # 1. 检查弹窗
-        if auto_dismiss_popup:
-            pop = self._check_popup(img_source)
-            if pop is not None:
-                self._dismiss_popup(pop)
-                time.sleep(0.5)
-                # 重新截图
-                img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
-                # 递归清除（可能有多层弹窗）
-                pop2 = self._check_popup(img_source)
-                if pop2 is not None:
-                    self._clear_popups()
-                    img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
+        if auto_dismiss_popup and pop is not None:
+            print(f"🔔 检测到弹窗: [{pop}]")
+            self._dismiss_popup(pop)  # 已等到弹窗消失，观察缓存为关闭后的画面
+            pop2, page = self.observe()
+            # 递归清除（可能有多层弹窗）
+            if pop2 is not None:
+                self._clear_popups()
+                _, page = self.observe()
 
         # 2. 检查页面状态
-        for state_name in self.page_order:
-            base_path_str = self.states_config["page-states"][state_name]
-            img_path = Path(base_path_str).with_suffix(".png")
-            if not img_path.is_absolute():
-                img_path = self.base_dir / img_path
-            if not img_path.exists():
-                print(f"⚠️ 找不到状态图片: {img_path}")
-                continue
-            res = self.v.find_image(img_source, str(img_path))
-            if res:
-                print(f"✅ 当前状态: [{state_name}]")
-                return state_name
+        if page:
+            startup.mark("first_state")
+            print(f"✅ 当前状态: [{page}]")
+            return page
 
         print("❌ 未匹配到任何状态")
         return None
 
-    def get_raw_state(self):
+    def get_raw_state(self, refresh=False):
         """
         获取原始状态（不自动关闭弹窗），返回 (类型, 名称)
         类型: "pop" / "page" / None
         """
-        img_source = self.screenshot_path if self.screenshot_path else self.operator.capture()
+        pop, page = self.observe(refresh)
 
         # 先查弹窗
-        pop = self._check_popup(img_source)
         if pop:
+            print(f"🔔 检测到弹窗: [{pop}]")
             return ("pop", pop)
 
         # 再查页面
-        for state_name in self.page_order:
-            base_path_str = self.states_config["page-states"][state_name]
-            img_path = Path(base_path_str).with_suffix(".png")
-            if not img_path.is_absolute():
-                img_path = self.base_dir / img_path
-            if not img_path.exists():
-                continue
-            res = self.v.find_image(img_source, str(img_path))
-            if res:
-                return ("page", state_name)
+        if page:
+            return ("page", page)
 
         return (None, None)
 
+    # ==================== 等待 ====================
+    def wait_for(self, target, timeout=3.0, budget=None, name=None):
+        """
+        等待画面到达目标，到达立即返回 True，超时返回 False
+        target: 状态名（页面或弹窗）、状态名的集合，或无参数的判断函数
+        等页面时出现了其他弹窗会提前返回 False（交给 get_states 清除弹窗后再判断）
+        budget: 原来固定等待的秒数，用于统计省下的时间
+        """
+        if callable(target):
+            return bool(waiting.wait_for(target, timeout, budget, name=name or "条件"))
+        targets = {target} if isinstance(target, str) else set(target)
+        outcome = {}
+
+        def reached():
+            pop, page = self.observe(refresh=True)
+            if pop in targets or page in targets:
+                outcome["hit"] = True
+                return True
+            return pop is not None  # 被弹窗挡住，不必再等
+
+        waiting.wait_for(reached, timeout, budget, name=name or "/".join(sorted(targets)))
+        return outcome.get("hit", False)
+
     # ==================== 导航 ====================
     def navigate_to(self, target, max_retries=3):
         """
         导航到目标页面状态
         遇到弹窗自动关闭后重新规划路径
         """
+        self.refresh()  # 距上次操作可能已过去很久，先看一眼最新画面
         for retry in range(max_retries):
             # 获取当前状态（自动清弹窗）
             current = self.get_states()
@@ -229,7 +217,7 @@ class StateManager:
                 print(f"🎉 已到达目标 [{target}]")
                 return True
 
-            # BFS 找路径
+            # 最短路径（按实测跳转代价）
             path = self._find_path(current, target)
             if path is None:
                 print(f"❌ 无法从 [{current}] 到达 [{target}]")
@@ -257,9 +245,9 @@ class StateManager:
                     success = False
                     break
 
-                change_key = self.state_graph[from_s][to_s]
+                # 只在 states.txt 声明为等效的跳转之间按实测成功率依次尝试（不会误点其他按钮）
                 print(f"⚡ 执行: {from_s} -> {to_s}")
-                if not self.states_change(change_key):
+                if not any(self.states_change(key, record=True) for key in self.routes.alternatives(from_s, to_s)):
                     print(f"❌ 转换失败，重新规划")
                     success = False
                     break
@@ -276,25 +264,17 @@ class StateManager:
         return False
 
     def _find_path(self, start, end):
-        """BFS 最短路径"""
-        if start not in self.state_graph:
-            return None
-        visited = {start}
-        queue = deque([(start, [start])])
-        while queue:
-            curr, path = queue.popleft()
-            for next_s in self.state_graph.get(curr, {}):
-                if next_s == end:
-                    return path + [next_s]
-                if next_s not in visited:
-                    visited.add(next_s)
-                    queue.append((next_s, path + [next_s]))
-        return None
+        """按实测跳转代价的最短路径（查编译好的下一跳表）"""
+        return self.routes.path(start, end)
 
     # ==================== 状态转换 ====================
-    def states_change(self, key):
-        """执行页面跳转"""
-        if key not in self.states_config["page-change"]:
+    def states_change(self, key, record=False):
+        """
+        执行页面跳转
+        record: 计入路由的跳转统计，只有 navigate_to 发起的跳转才记录（任务里直接点的按钮不代表导航代价）
+        """
+        section = self.config.change_section(key)
+        if section is None:
             print(f"❌ 找不到转换: {key}")
             return False
 
@@ -307,25 +287,33 @@ class StateManager:
             print(f"❌ 当前状态 [{current}] 非起始 [{start_state}]")
             return False
 
-        json_path = Path(self.states_config["page-change"][key]).with_suffix(".json")
-        if not json_path.is_absolute():
-            json_path = self.base_dir / json_path
+        json_path = self.config.change_path(section, key)
 
+        t0 = None  # 第一次点击的时刻；点过才计入跳转统计
         for i in range(5):
             current = self.get_states()
             if current == target_state:
                 print(f"🎉 已到达 [{target_state}]")
-                return True
+                return self._record_change(key, t0, True, record)
 
             print(f"⚡ [{key}] 第 {i+1} 次尝试，点击 {json_path}")
+            t0 = t0 or time.perf_counter()
             self.operator.click_json(str(json_path))
-            time.sleep(1.0)
-
-            if self.get_states() == target_state:
-                return True
+            if self.wait_for(target_state, timeout=3.0, budget=1.0):
+                print(f"🎉 已到达 [{target_state}]")
+                return self._record_change(key, t0, True, record)
+            # 没等到：可能是弹窗挡住，get_states 会先清除弹窗；重新截图以免错过刚完成的跳转
+            if self.get_states(refresh=True) == target_state:
+                return self._record_change(key, t0, True, record)
 
         print(f"❌ 转换失败: {key}")
-        return False
+        return self._record_change(key, t0, False, record)
+
+    def _record_change(self, key, t0, ok, record):
+        """记录跳转结果与耗时（更新路由权重），返回 ok"""
+        if record and t0 is not None:
+            self.routes.record(key, ok, time.perf_counter() - t0)
+        return ok
 
 
 # ==================== 运行 ====================
@@ -0,0 +1,121 @@
+"""
+ID 图库索引（替代逐个模板全图 find_image）
+
+- 建索引: ID/*.png 每张取标注框内的 ID 区域，缩成 DESC_SIZE 的灰度小图，去均值、归一化为描述子
+- 查询: 截图按各模板的标注框裁出 ID 区域（框相同的只裁一次）算描述子，与所有模板做一次点积（余弦相似度）取最近邻
+- 校验: 对最近邻模板在标注框附近做一次模板匹配，通过才算识别成功
+- IDdata.csv 启动时读入内存，识别结果直接附带该 ID 对应的区服列表
+"""
+import csv
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+ID_DIR = "tasks/change-regions/ID"
+ID_CSV = "tasks/change-regions/IDdata.csv"
+DESC_SIZE = (48, 12)  # 描述子尺寸 (宽, 高)，ID 区域是横条
+
+
+def load_id_data(csv_path=ID_CSV):
+    """读 IDdata.csv → {id: [[区, 服], ...]}"""
+    data = {}
+    path = Path(csv_path)
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    if not path.exists():
+        print(f"⚠️ 找不到 ID 数据: {path}")
+        return data
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f, skipinitialspace=True):
+            data.setdefault(row["id"].strip(), []).append(json.loads(row["region"]))
+    return data
+
+
+class IDIndex:
+    def __init__(self, vision, gallery=ID_DIR, csv_path=ID_CSV, min_similarity=0.6, margin=0.02):
+        """
+        vision: MyVision，模板从其模板库取，校验用其 find_image
+        min_similarity: 最近邻相似度低于此值视为不在图库中（不再做校验匹配）
+        margin: 校验匹配时标注框四周外扩的比例
+        """
+        self.v = vision
+        self.gallery = Path(gallery)
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.id_data = load_id_data(csv_path)
+        self.build()
+
+    @staticmethod
+    def _descriptor(img):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        vec = cv2.resize(gray, DESC_SIZE, interpolation=cv2.INTER_AREA).reshape(-1).astype(np.float32)
+        vec -= vec.mean()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def build(self):
+        """扫描图库建索引；图库增删文件后调用一次"""
+        self.keys, self.boxes, descs = [], [], []
+        gallery = self.gallery if self.gallery.is_absolute() else PROJECT_ROOT / self.gallery
+        for png in sorted(gallery.glob("*.png")):
+            entry = self.v.templates.get(png)
+            if entry is None or entry.box is None:
+                print(f"⚠️ ID 模板缺少标注，跳过: {png.name}")
+                continue
+            (x1, y1), (x2, y2) = entry.box
+            w, h = entry.image_size
+            self.keys.append(entry.key)
+            self.boxes.append((x1 / w, y1 / h, x2 / w, y2 / h))
+            descs.append(self._descriptor(entry.image))
+        self.matrix = np.stack(descs) if descs else np.zeros((0, DESC_SIZE[0] * DESC_SIZE[1]), np.float32)
+        # 标注框相同的模板共用一次裁切
+        self._groups = {}
+        for i, box in enumerate(self.boxes):
+            self._groups.setdefault(tuple(round(c, 3) for c in box), []).append(i)
+        print(f"🗂️ ID 索引: {len(self.keys)} 个模板, {len(self._groups)} 个区域")
+        return self
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _query(self, img):
+        """返回每个模板与截图对应区域的相似度"""
+        h, w = img.shape[:2]
+        sims = np.full(len(self.keys), -1.0, np.float32)
+        for (x1, y1, x2, y2), idx in self._groups.items():
+            crop = img[int(y1 * h):int(y2 * h), int(x1 * w):int(x2 * w)]
+            if crop.size == 0:
+                continue
+            sims[idx] = self.matrix[idx] @ self._descriptor(crop)
+        return sims
+
+    def lookup(self, img):
+        """
+        识别截图中的 ID
+        返回 {"id", "score", "box", "regions"}，不在图库中返回 None
+        """
+        img = self.v._load(img)
+        if img is None or not len(self.keys):
+            return None
+        sims = self._query(img)
+        best = int(sims.argmax())
+        if sims[best] < self.min_similarity:
+            return None
+
+        x1, y1, x2, y2 = self.boxes[best]
+        m = self.margin
+        window = [[max(0.0, x1 - m), max(0.0, y1 - m)], [min(1.0, x2 + m), min(1.0, y2 + m)]]
+        box = self.v.find_image(img, self.keys[best], a_percentage=window)
+        if box is None:
+            return None
+        name = Path(self.keys[best]).name
+        return {"id": name, "score": float(sims[best]), "box": box, "regions": self.regions_of(name)}
+
+    def regions_of(self, id_name):
+        return self.id_data.get(id_name, [])
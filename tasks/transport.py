@@ -9,16 +9,28 @@ from pathlib import Path
 # --- 路径适配 ---
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
-import vision
 import operate
+from engine import engine
+from capture import create_capture
+from detector import Detections, overlap_matrix
+import instrument
+import waiting
 from tasks.get_states import StateManager
 
 
 class TransportTask:
-    def __init__(self, app_name=None):
-        self.vision = vision.MyVision(yolo_model_path="models/best.pt")
-        self.mgr = StateManager("tasks/states.txt", app_name=app_name)
-        self.op = operate.Operator(app_name)
+    def __init__(self, app_name=None, capture="auto", stream_fps=None):
+        # 检测模型 / OCR / 模板库 / 字形库进程内共用（见 engine.py），多窗口不重复加载
+        self.vision = engine.vision("models/best.pt")
+        self.digits = engine.digits()
+        # 两个 Operator 共用同一个截图后端（回放时两边看到的是同一序列帧）
+        capturer = create_capture(capture)
+        self.mgr = StateManager("tasks/states.txt", app_name=app_name, capture=capturer)
+        self.op = operate.Operator(app_name, capturer)
+        # 后台连续截图帧率，None 为同步截图；只在本窗口执行任务期间开启（其他时间窗口可能被遮挡）
+        self.stream_fps = stream_fps
+        # 与 StateManager 共用同一窗口的画面门控
+        self.gate = self.mgr.gate
         self.resource = None
         self.res0 = None
         self.transport = None
@@ -48,7 +60,7 @@ class TransportTask:
             else:
                 return None
 
-            time.sleep(0.5)
+            self.mgr.wait_for("caiji", timeout=2.0, budget=0.5)
             state = self.mgr.get_states()
             self.mgr.states_change("caiji_shangzhen_01")
             state = self.mgr.get_states()
@@ -92,67 +104,73 @@ class TransportTask:
                 print(f"⚠ 第{attempt+1}次未进入上阵界面，重试...")
                 self.mgr.navigate_to('lingdi')
                 self.mgr.states_change("shangzhen_lingdi_01")
-                time.sleep(1)
+                self.mgr.wait_for("lingdi", timeout=2.0, budget=1.0)
 
         print("⚠ 达到最大重试次数，放弃选择海兽")
 
-    def I_resources(self):
+    def I_resources(self, datas=None):
+        """datas: 外部（如多窗口批量识别 detect_yolo_batch）已得到的本窗口检测结果，None 则自己截图识别"""
         #print("开始识别资源")
-        resources, birds, transported= self.detect_resources_and_birds()
+        resources, birds, transported= self.detect_resources_and_birds(datas)
         self.res0 = len(resources)
-        filtered_resources = []
-        for res in resources:
-            overlap_with_any_bird = False
-            for bird in birds:
-                if self.is_overlap(res, bird):
-                    overlap_with_any_bird = True
-                    break # 只要与一个bird重叠，就无需检查其他birds
-            # 如果没有与任何bird重叠，则保留该resource
-            if not overlap_with_any_bird:
-                filtered_resources.append(res)
-        self.resource = filtered_resources
-        self.transport = transported
-        self.bird =  birds
-
-
-
-    def detect_resources_and_birds(self):
-        img_input =  self.op.capture()
-        datas = self.vision.detect_yolo(img_input)
-        #print(f"YOLO 识别结果: {datas}")
-        resources = []
-        birds = []
-        transported = []
-        if datas:
-            #print(f"DEBUG: {datas}") 
-            for item in datas:
-                name = item['name'].lower()  # 转小写
-                box = item['box']
-                if 'resource' in name:       # 包含 resource 即可
-                    resources.append(box)
-                elif 'bird' in name:         # 包含 bird 即可
-                    birds.append(box)
-                elif 'transport' in name:    # 包含 transport 即可
-                    transported.append(box)
-        return resources, birds, transported       
-
-    def is_overlap(self, box1, box2):
-        # box1 坐标
-        x1_min, y1_min = box1[0]
-        x1_max, y1_max = box1[1]
-        # box2 坐标
-        x2_min, y2_min = box2[0]
-        x2_max, y2_max = box2[1]
-        if x1_max < x2_min or x1_min > x2_max or y1_max < y2_min or y1_min > y2_max:
-            return False
-        return True
+        # 与任意一只 bird 重叠的 resource 去掉（一次矩阵运算完成所有两两判断）
+        overlap_with_any_bird = overlap_matrix(resources.boxes, birds.boxes).any(axis=1)
+        self.resource = resources[~overlap_with_any_bird].box_list()
+        self.transport = transported.box_list()
+        self.bird = birds.box_list()
+
 
 
+    def detect_resources_and_birds(self, datas=None):
+        """返回 (resources, birds, transported) 三组 Detections，类别名包含关键字即可（按此优先级互斥）"""
+        if datas is None:
+            img_input =  self.op.capture()
+            datas = self.gate.get_or_compute(img_input, "yolo", lambda: self.vision.detect_yolo(img_input))
+        elif not isinstance(datas, Detections):
+            datas = Detections.from_dicts(datas)  # [{"name", "box", "conf"}, ...]
+        #print(f"YOLO 识别结果: {datas}")
+        return datas.split('resource', 'bird', 'transport')
+
     def I_beasts(self):
         screenshot = self.op.capture()
+        # 计数决定分配多少只，每次都重新读，不走画面门控
+        chose, shangxian, xian = self._read_beasts(screenshot)
+        self.chose = int(chose)
+        if xian != 0 and chose == 0:
+            self.chose = 1
+        self.shangxian = int(shangxian)
+        self.xian = xian
+
+        print(f"当前选择: {self.chose}, 上限: {shangxian}, 闲: {xian}")
+
+    def _read_beasts(self, screenshot):
+        """读上阵界面的 选择/上限 与 闲置数量，返回 (chose, shangxian, xian)"""
         # limit_1 for chose/shangxian
         limit_1 = self.vision.limit_scope("tasks/transport/mouse_combo/chose.png", scale=1.0)
-        ocr_sel = self.vision.detect_text(screenshot, a_percentage=limit_1, n=16)
+        # 先用字形模板读数（毫秒级，不加载 EasyOCR），认不出再走 OCR
+        chose, shangxian = self.digits.read_ratio(screenshot, limit_1)
+        if chose is None:
+            chose, shangxian = self._ocr_ratio(screenshot, limit_1)
+
+        print(f"chose:{chose}, shangxian: {shangxian}")
+        # limit_2 for xian
+        limit_2 = self.vision.limit_scope("tasks/transport/mouse_combo/xian.png", scale=1.0)
+        print("=" * 60)
+        #print(screenshot)
+        xian = self.digits.read_int(screenshot, limit_2)
+        if xian is None:
+            ocr_xian = self.vision.detect_text(screenshot, a_percentage=limit_2, n=16, math=True)
+            #print("=" * 60)
+            #print(f"xian现有结果: {ocr_xian}")
+
+            raw_xian = ocr_xian[0].get('text', '') if ocr_xian else ''
+            match_xian = re.search(r'(\d+)', raw_xian)
+            xian = int(match_xian.group(1))
+        return chose, shangxian, xian
+
+    def _ocr_ratio(self, screenshot, limit):
+        """EasyOCR 读 "x/y"，并修正常见误识别；字形模板认不出时使用"""
+        ocr_sel = self.vision.detect_text(screenshot, a_percentage=limit, n=16)
         ocr_sel = fix_ocr_text(ocr_sel[0].get('text', '') if ocr_sel else '') if ocr_sel else ''
         print(f"ocr_sel识别结果: {ocr_sel}")
         raw_sel = ocr_sel
@@ -171,31 +189,10 @@ class TransportTask:
                 shangxian = 3
             if raw_sel and raw_sel[0].isdigit():
                 chose = int(raw_sel[0])
-
-        print(f"chose:{chose}, shangxian: {shangxian}")
-        # limit_2 for xian
-        limit_2 = self.vision.limit_scope("tasks/transport/mouse_combo/xian.png", scale=1.0)
-        print("=" * 60)
-        #print(screenshot)
-        ocr_xian = self.vision.detect_text(screenshot, a_percentage=limit_2, n=16, math=True)
-        #print("=" * 60)
-        #print(f"xian现有结果: {ocr_xian}")
-
-
-        raw_xian = ocr_xian[0].get('text', '') if ocr_xian else ''
-        match_xian = re.search(r'(\d+)', raw_xian)
-        xian = int(match_xian.group(1))
-        self.chose = int(chose)
-        if xian != 0 and chose == 0:
-            self.chose = 1
-        self.shangxian = int(shangxian)
-        self.xian = xian
-
-        print(f"当前选择: {self.chose}, 上限: {shangxian}, 闲: {xian}")
+        return chose, shangxian
 
             
             
-            
     def tra_bird(self, stop_m = False):
         self.mgr.navigate_to('lingdi')
         self.mgr.get_states()
@@ -213,7 +210,7 @@ class TransportTask:
         for i in range(5):
             self.I_resources()
             self.op.click(self.bird[0]) #进入
-            time.sleep(1)
+            self.mgr.wait_for("guankan", timeout=3.0, budget=1.0)
             state = self.mgr.get_states()
             if state == 'guankan':
                 break
@@ -222,14 +219,16 @@ class TransportTask:
             pass
         if self.mgr.get_states() == 'guankan':
             self.op.click_json("tasks/transport/mouse_combo/guankan.png")
-            time.sleep(35)
+            self.wait_ad(timeout=60.0, budget=35.0)
             self.op.click_json("tasks/transport/mouse_combo/guanbi.png")
-            time.sleep(1)
+            # 关掉后回到 观看/领地，或弹出"暂未获得奖励 是否继续观看"
+            self.mgr.wait_for(lambda: self.mgr.observe(refresh=True)[1] in ('guankan', 'lingdi')
+                              or self._ad_unfinished(), timeout=3.0, budget=1.0, name="广告关闭")
             for i in range(3):
                 state = self.mgr.get_states()
                 if state != 'guankan' and state != 'lingdi':
                     self.op.click_json("tasks/transport/mouse_combo/jixukan.png")
-                    time.sleep(5)
+                    self.wait_ad(timeout=40.0, budget=5.0)
                     self.op.click_json("tasks/transport/mouse_combo/guanbi.png")
             self.I_resources()
             self.choose_beast()
@@ -237,7 +236,79 @@ class TransportTask:
             self.choose_beast()
 
 
-    def run(self, t_m = False):       
+    def _ad_close_button(self, frame):
+        """广告界面右上角的 关闭 按钮位置（像素框），广告还没出来（加载中 / 黑屏）时为 None"""
+        key = "tasks/transport/mouse_combo/guanbi.png"
+        if self.vision.templates.get(key) is None:
+            return None
+        return self.vision.find_image(frame, key, self.vision.limit_scope(key, scale=2.0))
+
+    def _ad_countdown(self, frame, close_box):
+        """
+        读"N 秒后可获得奖励"的秒数：在找到的 关闭 按钮同一行、画面左半边读数字，读不到返回 None
+        先用字形库；认不出再用 OCR，但只在 OCR 已经加载过时才用（不为等广告专门加载 EasyOCR）
+        """
+        h, w = frame.shape[:2]
+        (x1, y1), (_, y2) = close_box
+        region = [[0.0, max(0.0, y1 / h - 0.01)], [min(0.5, x1 / w), min(1.0, y2 / h + 0.01)]]
+        left = self.digits.read_int(frame, region)
+        if left is None and self.vision.ocr_reader is not None:
+            texts = self.vision.detect_text(frame, a_percentage=region, n=8, math=True)
+            m = re.search(r'(\d+)', ' '.join(t.get('text', '') for t in texts or []))
+            left = int(m.group(1)) if m else None
+        return left
+
+    def _ad_unfinished(self):
+        """是否弹出了"暂未获得奖励 是否继续观看视频"（继续 按钮位置出现该模板）"""
+        key = "tasks/transport/mouse_combo/jixukan.png"
+        if self.vision.templates.get(key) is None:
+            return False
+        near = self.vision.limit_scope(key, scale=2.0)
+        return self.vision.find_image(self.op.capture(), key, near) is not None
+
+    def wait_ad(self, timeout=60.0, budget=35.0):
+        """
+        等广告倒计时结束：
+        - 读到剩余秒数时直接睡到快结束再看，不频繁识别
+        - 读到过倒计时之后，关闭 按钮还在、连续两次读不到数字，视为倒计时结束
+        - 没读到过倒计时（广告加载中 / 黑屏 / 数字认不出）时读不到不算结束，等满原固定的 budget 秒
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + timeout
+        seen = [False]
+        misses = [0]
+
+        def finished():
+            frame = self.op.capture()
+            close_box = self._ad_close_button(frame)
+            left = self._ad_countdown(frame, close_box) if close_box is not None else None
+            if left is not None:
+                seen[0] = True
+                misses[0] = 0
+                instrument.sleep(min(max(left - 1, 0), max(0.0, deadline - time.perf_counter())))
+                return False
+            if close_box is not None and seen[0]:
+                misses[0] += 1
+                return misses[0] >= 2
+            return time.perf_counter() - t0 >= budget
+
+        waiting.wait_for(finished, timeout, budget, first=0.5, max_interval=2.0, name="广告")
+
+    def run(self, t_m = False):
+        # 本轮所有调用记到该窗口下，"run" 为整轮墙钟时间
+        if self.stream_fps:
+            worker = self.mgr.operator.start_stream(self.stream_fps)
+            self.op.start_stream(worker=worker)
+        try:
+            with instrument.window(self.op.app_name), instrument.span("run"):
+                self._run(t_m)
+        finally:
+            self.op.stream = None
+            self.mgr.operator.stop_stream()
+        if instrument.enabled():
+            instrument.report(self.op.app_name)
+
+    def _run(self, t_m = False):
         print("="*60 ,"🚀 开始运输任务", sep="\n" )
         self.xian = None
         self.chose = None
@@ -266,6 +337,10 @@ class TransportTask:
 
         except Exception as e:
             print(f"❌ 异常: {e}")
+        self.gate.report(f" [{self.op.app_name}]")
+        waiting.report(self.op.app_name, f" [{self.op.app_name}]")
+        obs = self.mgr.obs_stats
+        print(f"👁️ 状态观察 [{self.op.app_name}]: 复用 {obs['hit']} 次，截图识别 {obs['miss']} 次")
         print("=" * 60)
 
 
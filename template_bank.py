@@ -0,0 +1,163 @@
+import os
+import json
+import threading
+import cv2
+import numpy as np
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent
+# 这些目录下的模板位置固定（页面/弹窗状态），可以只在 JSON 标注位置附近搜索
+LOCAL_SEARCH_DIRS = ("page-states", "pop-states")
+
+
+def build_pyramid(img, levels):
+    """高斯金字塔：[原图, 1/2, 1/4, ...]，共 levels+1 层"""
+    pyr = [img]
+    for _ in range(levels):
+        pyr.append(cv2.pyrDown(pyr[-1]))
+    return pyr
+
+
+class TemplateEntry:
+    """单个模板：裁切好的连续 uint8 图像 + labelme 元数据"""
+
+    def __init__(self, key, png_path):
+        self.key = key
+        self.png_path = str(png_path)
+        self.json_path = os.path.splitext(self.png_path)[0] + '.json'
+        self.image = None        # 裁切后的模板（连续 uint8）
+        self.box = None          # 模板在原截图中的像素位置 [[x1,y1],[x2,y2]]
+        self.image_size = None   # 原截图尺寸 (w, h)
+        self.label = None
+        self.local_search = Path(self.png_path).parent.name in LOCAL_SEARCH_DIRS
+        self._mtimes = None
+        self._pyramid = None
+
+    def _stat(self):
+        png_m = os.stat(self.png_path).st_mtime_ns
+        json_m = os.stat(self.json_path).st_mtime_ns if os.path.exists(self.json_path) else None
+        return png_m, json_m
+
+    def is_stale(self):
+        try:
+            return self._stat() != self._mtimes
+        except OSError:
+            return True
+
+    def load(self):
+        """读取 PNG（支持中文路径）并按 JSON 第一个形状裁切"""
+        mtimes = self._stat()
+        img = cv2.imdecode(np.fromfile(self.png_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"无法读取模板图片: {self.png_path}")
+        h, w = img.shape[:2]
+        self.image_size = (w, h)
+        self.box = [[0, 0], [w, h]]
+
+        if mtimes[1] is not None:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            shape = data['shapes'][0]
+            points = shape['points']
+            x1, y1 = int(min(p[0] for p in points)), int(min(p[1] for p in points))
+            x2, y2 = int(max(p[0] for p in points)), int(max(p[1] for p in points))
+            self.box = [[x1, y1], [x2, y2]]
+            self.label = shape.get('label')
+            img = img[y1:y2, x1:x2]
+
+        self.image = np.ascontiguousarray(img.astype(np.uint8, copy=False))
+        self._mtimes = mtimes
+        self._pyramid = None
+        return self
+
+    def search_window(self, margin):
+        """
+        预期位置搜索窗口：JSON 标注框向四周各扩 margin（占整图宽高的比例），返回 a_percentage
+        不适用局部搜索的模板返回 None
+        """
+        if not self.local_search or margin is None or self.box is None:
+            return None
+        (x1, y1), (x2, y2) = self.box
+        w, h = self.image_size
+        return [[max(0.0, x1 / w - margin), max(0.0, y1 / h - margin)],
+                [min(1.0, x2 / w + margin), min(1.0, y2 / h + margin)]]
+
+    def pyramid(self, levels):
+        """模板的金字塔（按需构建并缓存）"""
+        if self._pyramid is None or len(self._pyramid) <= levels:
+            self._pyramid = build_pyramid(self.image, levels)
+        return self._pyramid
+
+
+class TemplateBank:
+    """
+    模板库：启动时一次性加载 tasks/ 下所有模板，常驻内存
+    - key 为相对项目根目录、去掉后缀的路径，如 "tasks/page-states/zhuye"（与 states.txt 中的值一致）
+    - get() 时按文件 mtime 检查，文件变动则自动重新加载
+    - 可被多个线程共用（见 engine.py）：重新加载时构建新的 TemplateEntry 再替换，不原地修改正在使用的模板
+    """
+
+    def __init__(self, root="tasks", base_dir=PROJECT_ROOT, preload=True):
+        self.base_dir = Path(base_dir).resolve()
+        self.root = (self.base_dir / root).resolve()
+        self._entries = {}
+        self._lock = threading.Lock()
+        if preload:
+            self.load_all()
+
+    def key_of(self, path):
+        """路径(str/Path, 可带 .png/.json 后缀, 可为绝对路径) → key"""
+        p = Path(path)
+        if p.suffix.lower() in {".png", ".json"}:
+            p = p.with_suffix("")
+        if p.is_absolute():
+            try:
+                p = p.resolve().relative_to(self.base_dir)
+            except ValueError:
+                return None
+        return p.as_posix()
+
+    def load_all(self):
+        """扫描 root 下全部 PNG 并加载"""
+        if not self.root.exists():
+            print(f"⚠️ 模板目录不存在: {self.root}")
+            return self
+        for png in sorted(self.root.rglob("*.png")):
+            key = self.key_of(png)
+            try:
+                self._entries[key] = TemplateEntry(key, png).load()
+            except Exception as e:
+                print(f"⚠️ 模板加载失败 {png}: {e}")
+        return self
+
+    def get(self, path_or_key):
+        """取模板；未加载过则按需加载，mtime 变化则重新加载，文件不存在返回 None"""
+        key = self.key_of(path_or_key)
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and not entry.is_stale():
+            return entry
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not entry and current is not None and not current.is_stale():
+                return current  # 其他线程刚刚加载过
+            png = self.base_dir / (key + ".png")
+            if not png.exists():
+                self._entries.pop(key, None)
+                return None
+            try:
+                entry = self._entries[key] = TemplateEntry(key, png).load()
+            except Exception as e:
+                print(f"⚠️ 模板加载失败 {png}: {e}")
+                return None
+            return entry
+
+    def __contains__(self, path_or_key):
+        return self.get(path_or_key) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        return list(self._entries.keys())
@@ -2,30 +2,82 @@ import cv2
 import numpy as np
 import os
 import json
-import torch
-from coordinate_utils import CoordinateConverter
+import time
+import queue
+import threading
 from pathlib import Path
-from PIL import Image
+from template_bank import TemplateBank, build_pyramid
+from detector import create_detector, Detections
+from matching import MatchEngine
+from frame import Frame
+from annotations import annotations
+import instrument
+
+
+class FrameDumper:
+    """调试用：后台线程异步把帧写到磁盘，不阻塞识别；队列满了直接丢帧"""
+
+    def __init__(self, folder, max_pending=8):
+        self.folder = folder
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._seq = 0
+        os.makedirs(folder, exist_ok=True)
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def dump(self, img, tag="frame"):
+        self._seq += 1
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{self._seq:05d}_{tag}.png"
+        try:
+            self._queue.put_nowait((os.path.join(self.folder, name), img.copy()))
+        except queue.Full:
+            pass
+
+    def _worker(self):
+        while True:
+            path, img = self._queue.get()
+            try:
+                ok, buf = cv2.imencode(".png", img)
+                if ok:
+                    buf.tofile(path)  # 支持中文路径
+            except Exception as e:
+                print(f"⚠️ 调试帧保存失败: {e}")
+
 
 class MyVision:
-    def __init__(self, yolo_model_path='models/best.pt'):
+    def __init__(self, yolo_model_path='models/best.pt', template_bank=None, pyramid_levels=0, search_margin=0.05,
+                 debug_dump=None, detector_backend="auto", matcher="auto"):
         # 只保存路径，不立即加载模型
         self.yolo_model_path = yolo_model_path
+        # 检测后端: "auto"（有 .onnx 用 onnxruntime/cv2.dnn，否则 torch） / "torch" / "onnx" / "dnn"
+        self.detector_backend = detector_backend
         self.model = None  # 延迟加载
         self.ocr_reader = None
+        self._load_lock = threading.Lock()  # 预热线程与识别线程可能同时触发加载
+        # 多个窗口共用同一个 MyVision（见 engine.py）：模型 / OCR 推理各自串行
+        self._detect_lock = threading.Lock()
+        self._ocr_lock = threading.Lock()
+        # 模板库：tasks/ 下的模板一次性加载进内存，find_image 可直接传 key
+        self.templates = template_bank if template_bank is not None else TemplateBank()
+        # 金字塔匹配层数：0 为原来的全分辨率穷举匹配；n 表示先在 1/2^n 分辨率粗匹配，再在原图邻域精修
+        self.pyramid_levels = pyramid_levels
+        # 页面/弹窗模板只在 JSON 标注位置附近搜索（向外扩 search_margin），None 表示始终全图搜索
+        self.search_margin = search_margin
+        # 匹配后端: "auto"（按模板大小选择） / "opencv" / "fft" / "sad"，tasks/matchers.json 可按模板单独指定
+        self.matching = MatchEngine(matcher)
+        # 局部搜索统计：local 局部搜索次数，fallback 退回全图次数，fallback_hit 退回全图后才找到的次数
+        self.roi_stats = {"local": 0, "fallback": 0, "fallback_hit": 0}
+        # 调试：传入目录则把送进 YOLO 的帧异步保存下来（替代原来的 window/temp_image.png）
+        self.dumper = FrameDumper(debug_dump) if debug_dump else None
 
     # --- 1. 范围限制功能 ---
     def limit_scope(self, image_path, scale=1.0):
-        json_path = os.path.splitext(image_path)[0] + '.json'
-        if not os.path.exists(json_path): 
+        # 百分比框在标注库中预先算好，不再每次读 JSON、读图片取尺寸
+        ann = annotations.get(image_path)
+        if ann is None:
             return [[0.0, 0.0], [1.0, 1.0]]
-        
-        with open(json_path, 'r', encoding='utf-8') as f:
-            points = json.load(f)['shapes'][0]['points']
-        
-        # 转换为 a_percentage
-        converter = CoordinateConverter(points, 'a_pixel', obj=image_path)
-        (x1, y1), (x2, y2) = converter.a_percentage
+        if ann.percent is None:
+            raise ann.error
+        (x1, y1), (x2, y2) = ann.percent
         
         cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
         w, h = (x2 - x1) * scale, (y2 - y1) * scale
@@ -33,93 +85,262 @@ class MyVision:
 
     # --- 私有方法：按需加载 YOLO 模型 ---
     def _load_yolo_model(self):
-        if self.model is None and os.path.exists(self.yolo_model_path):
-            #print("正在加载 YOLO 模型...（仅首次调用 detect_yolo 时加载）")
-            self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=self.yolo_model_path, device='cpu')  # 可改为 'cuda' 如果需要
-            #print("YOLO 模型加载完成！")
+        if self.model is None:
+            with self._load_lock:
+                if self.model is None:
+                    #print("正在加载 YOLO 模型...（仅首次调用 detect_yolo 时加载）")
+                    self.model = create_detector(self.yolo_model_path, self.detector_backend)
+                    #print("YOLO 模型加载完成！")
+
+    # --- 私有方法：按需加载 EasyOCR（import easyocr 会连带导入 torch，耗时数秒）---
+    def _load_ocr(self):
+        if self.ocr_reader is None:
+            with self._load_lock:
+                if self.ocr_reader is None:
+                    import easyocr
+                    self.ocr_reader = easyocr.Reader(['en'], gpu=True)  # 可改为 True 使用 GPU
+
+    def warm_up(self, detector=True, ocr=True, background=True):
+        """
+        预热：提前加载检测模型和 OCR（可选），避免任务进行到一半才卡住数秒
+        background=True 时在后台线程加载，返回线程对象；首次导航可以同时进行
+        """
+        def _run():
+            t0 = time.perf_counter()
+            try:
+                if detector:
+                    self._load_yolo_model()
+                if ocr:
+                    self._load_ocr()
+                print(f"🔥 模型预热完成，用时 {time.perf_counter() - t0:.1f}s")
+            except Exception as e:
+                print(f"⚠️ 模型预热失败: {e}")
+
+        if not background:
+            _run()
+            return None
+        t = threading.Thread(target=_run, daemon=True)
+        t.start()
+        return t
 
     # --- 修正后的 YOLO 识别函数（延迟加载）---
     def detect_yolo(self, img_input, a_percentage=None):
-        if isinstance(img_input, np.ndarray):
-            os.makedirs("window", exist_ok=True)
-            save_path_temp = "window/temp_image.png"
-            cv2.imwrite(save_path_temp, img_input)
-            img_input = save_path_temp
-            print(f"YOLO 识别输入: {img_input}")         
+        """
+        ndarray 截图直接送入模型（不再经过临时文件），路径则读取后识别
+        返回 Detections（boxes/scores/class_ids 数组 + 类别名表），遍历得到 {"name","box","conf"}
+        """
+        return self.detect_yolo_batch([img_input], [a_percentage])[0]
+
+    @instrument.timed("detect")
+    def detect_yolo_batch(self, img_inputs, a_percentages=None):
+        """
+        多窗口批量识别：所有帧 letterbox 成一个 batch 只做一次前向，再把结果拆回各帧
+        a_percentages: 与 img_inputs 等长的范围列表（None 表示都用全图）
+        返回与 img_inputs 一一对应的 Detections
+        """
         self._load_yolo_model()  # 关键：在这里才加载
-        img_bgr = self._load(img_input)
-        roi_bgr, (ox, oy) = self._get_roi(img_bgr, a_percentage)
-        roi_rgb = cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2RGB)
+        if a_percentages is None:
+            a_percentages = [None] * len(img_inputs)
+
+        rois, offsets, slots = [], [], []
+        for i, (img_input, a_percentage) in enumerate(zip(img_inputs, a_percentages)):
+            img_bgr = self._load(img_input)
+            if img_bgr is None:
+                continue
+            if self.dumper and isinstance(img_input, np.ndarray):
+                self.dumper.dump(img_bgr, "yolo")
+            roi_bgr, offset = self._get_roi(img_bgr, a_percentage)
+            rois.append(roi_bgr)
+            offsets.append(offset)
+            slots.append(i)
 
         print("YOLO 识别中...")
-        results = []
-        if self.model:
-            df = self.model(roi_rgb).pandas().xyxy[0]
-            for _, r in df.iterrows():
-                results.append({
-                    "name": r['name'], 
-                    "box": [[r['xmin']+ox, r['ymin']+oy], [r['xmax']+ox, r['ymax']+oy]],
-                    "conf": r['confidence']
-                })
+        names = getattr(self.model, "names", None)
+        results = [Detections.empty(names) for _ in img_inputs]
+        if self.model and rois:
+            with self._detect_lock:
+                batch = self.model.detect_batch(rois)
+            for i, dets, (ox, oy) in zip(slots, batch, offsets):
+                results[i] = dets.shift(ox, oy)
         return results
 
     def _load(self, data):
-        """支持中文路径读取图片"""
+        """支持中文路径读取图片；统一返回 Frame（已是 Frame 则原样返回，派生表示可复用）"""
         if isinstance(data, str):
             img = cv2.imdecode(np.fromfile(data, dtype=np.uint8), cv2.IMREAD_COLOR)
             if img is None:
                 print(f"❌ 无法读取图片路径: {data}")
-            return img 
-        return data
+            return Frame.of(img)
+        return Frame.of(data) if isinstance(data, np.ndarray) else data
 
 
-    def find_image(self, img1_input, img2_input, a_percentage=None):
+    @instrument.timed("match")
+    def find_image(self, img1_input, img2_input, a_percentage=None, levels=None):
+        """
+        img1_input: 大图（路径 / ndarray）
+        img2_input: 模板，可以是模板库 key（如 "tasks/page-states/zhuye"）、图片路径或 ndarray
+        levels: 金字塔层数，None 时使用 self.pyramid_levels
+        """
         # 1. 确保输入是字符串路径（处理 Path 对象）
         img1_path = str(img1_input) if isinstance(img1_input, (str, Path)) else img1_input
         img2_path = str(img2_input) if isinstance(img2_input, (str, Path)) else img2_input
 
-        # 2. 加载图片
+        # 2. 加载图片：模板优先从模板库取（已裁切、已是连续 uint8）
         img1 = self._load(img1_path)      # 大图
-        img2_full = self._load(img2_path) # 模板图
-        
-        if img1 is None or img2_full is None:
+        entry = self.templates.get(img2_path) if isinstance(img2_path, str) else None
+        tpl_pyr = None
+        if entry is not None:
+            img2_roi = entry.image
+            tpl_pyr = entry.pyramid
+            matcher = self.matching.select(img2_roi, entry.key)
+        else:
+            img2_full = self._load(img2_path) # 模板图
+            if img2_full is None:
+                return None
+            img2_roi = np.ascontiguousarray(self._get_template_roi(img2_path, img2_full).astype(np.uint8))
+            matcher = self.matching.select(img2_roi)
+
+        if img1 is None:
             return None
 
-        # 3. 获取各自的 ROI
-        roi_img1, (ox, oy) = self._get_roi(img1, a_percentage)
-        img2_roi = self._get_template_roi(img2_path, img2_full)
+        levels = self.pyramid_levels if levels is None else levels
 
-        # --- 核心修复：强制对齐数据格式 ---
-        # A. 确保通道数一致 (如果一个是单通道一个是三通道会报错)
-        if len(roi_img1.shape) != len(img2_roi.shape):
-            if len(roi_img1.shape) == 3:
-                img2_roi = cv2.cvtColor(img2_roi, cv2.COLOR_GRAY2BGR)
-            else:
-                roi_img1 = cv2.cvtColor(roi_img1, cv2.COLOR_GRAY2BGR)
+        # 3. 页面/弹窗模板：先在预期位置附近找，找不到再全图搜索
+        window = entry.search_window(self.search_margin) if entry is not None and a_percentage is None else None
+        if window is not None:
+            self.roi_stats["local"] += 1
+            box = self._find_in(img1, img2_roi, window, levels, tpl_pyr, matcher)
+            if box is not None:
+                return box
+            self.roi_stats["fallback"] += 1
+            box = self._find_in(img1, img2_roi, None, levels, tpl_pyr, matcher)
+            if box is not None:
+                self.roi_stats["fallback_hit"] += 1
+            return box
 
-        # B. 确保数据类型一致 (强制转为 uint8)
-        roi_img1 = roi_img1.astype(np.uint8)
-        img2_roi = img2_roi.astype(np.uint8)
+        return self._find_in(img1, img2_roi, a_percentage, levels, tpl_pyr, matcher)
 
-        # C. 确保连续内存 (防止 UMat 报错)
-        roi_img1 = np.ascontiguousarray(roi_img1)
-        img2_roi = np.ascontiguousarray(img2_roi)
+    def _find_in(self, img, tpl, a_percentage, levels, tpl_pyr=None, matcher=None):
+        """在 a_percentage 范围内找模板，匹配度 > 0.8 返回 box，否则 None"""
+        # 获取大图 ROI 并统一格式
+        roi, (ox, oy) = self._get_roi(img, a_percentage)
+        roi = self._prepare(roi)
 
-        # 4. 执行匹配
-        try:
-            res = cv2.matchTemplate(roi_img1, img2_roi, cv2.TM_CCOEFF_NORMED)
-            _, m_val, _, m_loc = cv2.minMaxLoc(res)
-            
-            if m_val > 0.8:
-                h, w = img2_roi.shape[:2]
-                return [[float(m_loc[0] + ox), float(m_loc[1] + oy)], 
-                        [float(m_loc[0] + w + ox), float(m_loc[1] + h + oy)]]
-        except Exception as e:
-            print(f"匹配过程中出错: {e}")
-            
+        # 执行匹配
+        m_val, m_loc = self._match(roi, tpl, levels, tpl_pyr=tpl_pyr, matcher=matcher)
+        if m_val > 0.8:
+            h, w = tpl.shape[:2]
+            return [[float(m_loc[0] + ox), float(m_loc[1] + oy)], 
+                    [float(m_loc[0] + w + ox), float(m_loc[1] + h + oy)]]
         return None
 
+    @instrument.timed("match")
+    def classify(self, img_input, keys, a_percentage=None, threshold=0.8, levels=None):
+        """
+        一次性多模板识别：大图只加载/裁切/格式化一次，对 keys 中所有模板打分
+        页面/弹窗模板先在各自预期位置附近打分；总有一个页面在画面上，页面模板局部全部落空
+        说明窗口布局可能变了，此时页面模板全图再打分一次，弹窗模板也一起全图打分
+        （没有弹窗是常态，页面在预期位置时不为弹窗做全图搜索）
+        返回按分数从高到低排序的列表: [{"key", "score", "box", "matched"}, ...]
+        """
+        img = self._load(str(img_input) if isinstance(img_input, Path) else img_input)
+        if img is None:
+            return []
+        full = self._prepare(img)
+        levels = self.pyramid_levels if levels is None else levels
+        roi, offset = self._get_roi(full, a_percentage)
+        roi_pyr = None
+
+        scores = {}
+        local_keys = {}  # 模板所在目录（page-states / pop-states）→ 局部打分的 key
+        for key in keys:
+            entry = self.templates.get(key)
+            if entry is None:
+                continue
+            window = entry.search_window(self.search_margin) if a_percentage is None else None
+            if window is not None:
+                self.roi_stats["local"] += 1
+                local_keys.setdefault(Path(entry.png_path).parent.name, []).append(key)
+                scores[key] = self._score(full, entry, window, levels)
+            else:
+                if roi_pyr is None and levels > 0:
+                    roi_pyr = roi.pyramid(levels) if isinstance(roi, Frame) else build_pyramid(roi, levels)
+                scores[key] = self._score(roi, entry, None, levels, roi_pyr, offset)
+
+        # 页面局部全部落空：可能是窗口布局变化，页面和弹窗都退回全图再找一次
+        pages = local_keys.get("page-states", [])
+        if pages and not any(scores[key][0] > threshold for key in pages):
+            self.roi_stats["fallback"] += 1
+            group = pages + local_keys.get("pop-states", [])
+            full_pyr = full.pyramid(levels) if levels > 0 else None
+            for key in group:
+                scores[key] = self._score(full, self.templates.get(key), None, levels, full_pyr)
+            if any(scores[key][0] > threshold for key in group):
+                self.roi_stats["fallback_hit"] += 1
+
+        ranked = [{"key": key, "score": float(m_val), "box": box, "matched": m_val > threshold}
+                  for key, (m_val, box) in scores.items()]
+        ranked.sort(key=lambda r: r["score"], reverse=True)
+        return ranked
 
+    def _score(self, img, entry, a_percentage, levels, roi_pyr=None, offset=(0, 0)):
+        """对单个模板打分，返回 (分数, box)；roi_pyr/offset 用于已裁切好的 ROI"""
+        if a_percentage is not None:
+            img, offset = self._get_roi(img, a_percentage)
+        ox, oy = offset
+        m_val, m_loc = self._match(img, entry.image, levels, roi_pyr=roi_pyr, tpl_pyr=entry.pyramid,
+                                   matcher=self.matching.select(entry.image, entry.key))
+        h, w = entry.image.shape[:2]
+        return m_val, [[float(m_loc[0] + ox), float(m_loc[1] + oy)],
+                       [float(m_loc[0] + w + ox), float(m_loc[1] + h + oy)]]
+
+    def _prepare(self, img):
+        """统一大图格式：三通道、uint8、连续内存（防止 matchTemplate 报错）；Frame 构建时已保证"""
+        if isinstance(img, Frame):
+            return img
+        if len(img.shape) == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return np.ascontiguousarray(img.astype(np.uint8, copy=False))
+
+    def _match(self, roi, tpl, levels=0, roi_pyr=None, tpl_pyr=None, matcher=None):
+        """
+        TM_CCOEFF_NORMED 口径打分，返回 (最高分, 左上角位置)；出错或模板比大图还大时分数为 -1
+        levels > 0 时走金字塔粗到精匹配；roi_pyr / tpl_pyr 为预先构建好的金字塔（或构建函数），可省去重复缩放
+        matcher: matching 中的匹配后端，None 为 opencv
+        """
+        if len(tpl.shape) == 2:
+            tpl = cv2.cvtColor(tpl, cv2.COLOR_GRAY2BGR)
+            tpl_pyr = None
+        if tpl.shape[0] > roi.shape[0] or tpl.shape[1] > roi.shape[1]:
+            return -1.0, (0, 0)
+
+        # 模板缩小后太小（< 8 像素）就没有区分度了，自动减少层数
+        while levels > 0 and min(tpl.shape[:2]) >> levels < 8:
+            levels -= 1
+        if levels <= 0:
+            return self._match_full(roi, tpl, matcher)
+
+        if roi_pyr is None or len(roi_pyr) <= levels:
+            roi_pyr = roi.pyramid(levels) if isinstance(roi, Frame) else build_pyramid(roi, levels)
+        tpl_pyr = tpl_pyr(levels) if callable(tpl_pyr) else tpl_pyr
+        if tpl_pyr is None or len(tpl_pyr) <= levels:
+            tpl_pyr = build_pyramid(tpl, levels)
+
+        # 1. 粗匹配：低分辨率整幅搜索
+        _, (cx, cy) = self._match_full(roi_pyr[levels], tpl_pyr[levels], matcher)
+
+        # 2. 精修：回到原分辨率，只在粗匹配位置附近 ±2^levels*2 像素内搜索
+        f = 1 << levels
+        margin = 2 * f
+        th, tw = tpl.shape[:2]
+        x1, y1 = max(0, cx * f - margin), max(0, cy * f - margin)
+        x2, y2 = min(roi.shape[1], cx * f + tw + margin), min(roi.shape[0], cy * f + th + margin)
+        m_val, (mx, my) = self._match_full(roi[y1:y2, x1:x2], tpl, matcher)
+        return m_val, (mx + x1, my + y1)
+
+    def _match_full(self, roi, tpl, matcher=None):
+        """单尺度匹配，具体算法由匹配后端决定（默认 opencv）"""
+        return (matcher or self.matching.opencv).match(roi, tpl)
 
     def _get_template_roi(self, img_path, img_data):
         """新增辅助函数：根据 JSON 裁切模板图"""
@@ -143,21 +364,16 @@ class MyVision:
         return img_data[y1:y2, x1:x2]
 
     # --- 文字识别 ---
+    @instrument.timed("ocr")
     def detect_text(self, img_input, a_percentage=None, n=4, math = None, chinese = None):
-        import easyocr
-        if not self.ocr_reader: 
-            '''
-            #print("正在初始化 EasyOCR（仅首次调用时加载）")
-            if chinese:
-                self.ocr_reader = easyocr.Reader(['ch_sim'], gpu=True)  # 可改为 True 使用 GPU
-            else:'''
-            self.ocr_reader = easyocr.Reader(['en'], gpu=True)  # 可改为 True 使用 GPU
+        self._load_ocr()
         img = self._load(img_input)
         roi, (ox, oy) = self._get_roi(img, a_percentage)
 
-        img2 = cv2.resize(roi, None, fx=n, fy=n, interpolation=cv2.INTER_CUBIC)
-        # 2. 转为灰度
-        gray = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+        # 1. 转为灰度（Frame 的灰度图已缓存）再放大，只需放大单通道
+        roi_gray = roi.gray if isinstance(roi, Frame) else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        # 2. 放大
+        gray = cv2.resize(roi_gray, None, fx=n, fy=n, interpolation=cv2.INTER_CUBIC)
         # 3. 增强对比度 & 二值化
         # 使用大津法 (Otsu's thresholding) 自动寻找阈值
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
@@ -173,22 +389,23 @@ class MyVision:
         cv2.imwrite(image_path, processed_img)     
         '''
 
-        if math:
-            #img11 = cv2.imread(image_path)      
-            text_output = self.ocr_reader.readtext(
-                processed_img,
-                #detail = 0,                # 只返回文字列表
-                allowlist = '0123456789',  # 只认 0~9，极大提高纯数字准确率
-                # 可选加这些参数进一步优化
-                paragraph = False,         # 不合并成段落
-                min_size = 5,             # 忽略太小的检测框
-                contrast_ths = 0.1,
-                adjust_contrast = 0.5,
-                text_threshold = 0.3,
-                low_text = 0.3,
-            )
-        else:
-            text_output = self.ocr_reader.readtext(processed_img)
+        with self._ocr_lock:
+            if math:
+                #img11 = cv2.imread(image_path)      
+                text_output = self.ocr_reader.readtext(
+                    processed_img,
+                    #detail = 0,                # 只返回文字列表
+                    allowlist = '0123456789',  # 只认 0~9，极大提高纯数字准确率
+                    # 可选加这些参数进一步优化
+                    paragraph = False,         # 不合并成段落
+                    min_size = 5,             # 忽略太小的检测框
+                    contrast_ths = 0.1,
+                    adjust_contrast = 0.5,
+                    text_threshold = 0.3,
+                    low_text = 0.3,
+                )
+            else:
+                text_output = self.ocr_reader.readtext(processed_img)
             
         final = []
         for (bbox, text, prob) in text_output:
@@ -197,6 +414,8 @@ class MyVision:
         return final
 
     def _get_roi(self, img, a_perc):
+        if isinstance(img, Frame):
+            return img.roi(a_perc)  # 同一帧同一范围只裁切一次
         if not a_perc: 
             return img, (0, 0)
         h, w = img.shape[:2]
@@ -0,0 +1,433 @@
+"""
+视觉模块对比/测试脚本
+
+用法：
+    python vision_bench.py bench --captures screenshots --save bench/baseline.json
+    python vision_bench.py bench --captures screenshots --compare bench/baseline.json
+    python vision_bench.py pyramid --levels 1 2 --screens screenshots tasks/page-states
+    python vision_bench.py detector --backends torch onnx dnn
+    python vision_bench.py matcher --screens window screenshots
+    python vision_bench.py states --replay window
+
+bench 可在无桌面的 Linux 上运行：只依赖 tasks/ 下的模板和一个截图目录
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+import vision
+from detector import BACKENDS, create_detector
+from digit_reader import DigitReader
+from frame_gate import FrameGate
+from matching import MATCHERS
+
+DEFAULT_SCREENS = ["screenshots", "window", "tasks/page-states", "tasks/pop-states"]
+STATE_DIRS = ["tasks/page-states", "tasks/pop-states"]
+
+
+def load_screens(dirs):
+    """读取截图目录下的所有 png，返回 [(路径, 图像)]"""
+    screens = []
+    for d in dirs:
+        p = Path(d)
+        if not p.is_absolute():
+            p = PROJECT_ROOT / p
+        if not p.exists():
+            continue
+        for f in sorted(p.glob("*.png")):
+            img = cv2.imdecode(np.fromfile(str(f), dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is not None and img.shape[0] > 100 and img.shape[1] > 100:
+                screens.append((f, img))
+    return screens
+
+
+def state_keys(v):
+    return [k for k in v.templates.keys() if any(k.startswith(d + "/") for d in STATE_DIRS)]
+
+
+def compare_pyramid(v, screens, keys, levels_list):
+    """
+    金字塔模式 vs 原全分辨率穷举模式：
+    - 一致率：两种模式对"是否匹配(>0.8)"的判断一致的比例
+    - 漏检/误检：以穷举模式为准
+    - 位置误差：两者都匹配时左上角的像素距离
+    - 耗时与加速比
+    """
+    baseline = {}
+    t0 = time.perf_counter()
+    for si, (_, img) in enumerate(screens):
+        for key in keys:
+            baseline[(si, key)] = v.find_image(img, key, levels=0)
+    base_time = time.perf_counter() - t0
+    n = len(baseline)
+    print(f"穷举模式: {len(screens)} 张截图 x {len(keys)} 个模板, 耗时 {base_time:.3f}s")
+
+    report = {}
+    for levels in levels_list:
+        agree = missed = extra = 0
+        errors = []
+        t0 = time.perf_counter()
+        for si, (_, img) in enumerate(screens):
+            for key in keys:
+                got = v.find_image(img, key, levels=levels)
+                ref = baseline[(si, key)]
+                if (got is None) == (ref is None):
+                    agree += 1
+                    if got is not None:
+                        errors.append(np.hypot(got[0][0] - ref[0][0], got[0][1] - ref[0][1]))
+                elif got is None:
+                    missed += 1
+                else:
+                    extra += 1
+        cost = time.perf_counter() - t0
+        report[levels] = {
+            "agreement": agree / n if n else 1.0,
+            "missed": missed,
+            "extra": extra,
+            "max_loc_error": float(max(errors)) if errors else 0.0,
+            "time": cost,
+            "speedup": base_time / cost if cost else 0.0,
+        }
+        r = report[levels]
+        print(f"levels={levels}: 一致率 {r['agreement']:.2%}, 漏检 {missed}, 误检 {extra}, "
+              f"最大位置误差 {r['max_loc_error']:.1f}px, 耗时 {cost:.3f}s, 加速 {r['speedup']:.1f}x")
+    return report
+
+
+def compare_detectors(model_path, screens, backends, batch=4):
+    """
+    各检测后端对比：启动耗时（创建 + 首帧推理）、平均单帧延迟、batch 推理平均每帧耗时、每帧检测数
+    """
+    report = {}
+    for backend in backends:
+        t0 = time.perf_counter()
+        try:
+            det = create_detector(model_path, backend)
+        except Exception as e:
+            print(f"{backend}: 加载失败 {e}")
+            continue
+        if det is None:
+            print(f"{backend}: 找不到模型文件")
+            continue
+        if not screens:
+            continue
+        det.detect(screens[0][1])
+        startup = time.perf_counter() - t0
+
+        counts = []
+        t0 = time.perf_counter()
+        for _, img in screens:
+            counts.append(len(det.detect(img)))
+        latency = (time.perf_counter() - t0) / len(screens)
+        # 多窗口：逐张调用 vs 一次 batch
+        frames = [img for _, img in screens[:batch]]
+        t0 = time.perf_counter()
+        det.detect_batch(frames)
+        batched = (time.perf_counter() - t0) / len(frames)
+        report[backend] = {"startup": startup, "latency": latency, "batched": batched, "counts": counts}
+        print(f"{backend}: 启动 {startup:.2f}s, 平均延迟 {latency * 1000:.1f}ms, "
+              f"batch={len(frames)} 平均每帧 {batched * 1000:.1f}ms, 检测数 {counts}")
+    return report
+
+
+def compare_matchers(bank, screens, backends=tuple(MATCHERS), margin=0.05,
+                     buckets=(1000, 2500, 5000, 10000)):
+    """
+    各匹配后端对比（以 opencv 为准），按模板面积分档：
+    - local: 在标注框外扩 margin 的窗口内匹配（页面/弹窗状态识别的常见情况）；full: 全图
+    - 一致: 对"是否匹配(>0.8)"判断相同，且都匹配时位置误差 ≤ 2px
+    - 每档每个后端的平均耗时
+    """
+    entries = [bank.get(k) for k in bank.keys()]
+    entries = [e for e in entries if e is not None and e.box is not None]
+    edges = list(buckets) + [float("inf")]
+
+    def bucket_of(e):
+        area = e.image.shape[0] * e.image.shape[1]
+        return next(i for i, b in enumerate(edges) if area <= b)
+
+    # 预热（首次调用有线程池/内存分配开销，不计入）
+    for name in backends:
+        MATCHERS[name]().match(screens[0][1], entries[0].image)
+
+    stats = {}
+    for _, img in screens:
+        H, W = img.shape[:2]
+        for e in entries:
+            (x1, y1), (x2, y2) = e.box
+            w, h = e.image_size
+            mx, my = margin * W, margin * H
+            lx1, ly1 = max(0, int(x1 / w * W - mx)), max(0, int(y1 / h * H - my))
+            lx2, ly2 = min(W, int(x2 / w * W + mx)), min(H, int(y2 / h * H + my))
+            for mode, roi in (("local", img[ly1:ly2, lx1:lx2]), ("full", img)):
+                roi = np.ascontiguousarray(roi)
+                results = {}
+                for name in backends:
+                    t0 = time.perf_counter()
+                    results[name] = MATCHERS[name]().match(roi, e.image)
+                    dt = time.perf_counter() - t0
+                    st = stats.setdefault((mode, bucket_of(e), name), {"n": 0, "time": 0.0, "agree": 0, "missed": 0})
+                    st["n"] += 1
+                    st["time"] += dt
+                ref_val, ref_loc = results["opencv"]
+                for name, (val, loc) in results.items():
+                    st = stats[(mode, bucket_of(e), name)]
+                    if (val > 0.8) == (ref_val > 0.8) and (
+                            ref_val <= 0.8 or np.hypot(loc[0] - ref_loc[0], loc[1] - ref_loc[1]) <= 2):
+                        st["agree"] += 1
+                    elif ref_val > 0.8:
+                        st["missed"] += 1
+
+    print(f"{len(screens)} 张截图 x {len(entries)} 个模板")
+    print(f"{'模式':<6}{'面积':<14}{'后端':<8}{'次数':>6}{'平均(ms)':>10}{'一致率':>9}{'漏检':>6}")
+    for mode in ("local", "full"):
+        for bi in range(len(edges)):
+            lo = 0 if bi == 0 else edges[bi - 1]
+            label = f"{lo}-{edges[bi]}" if edges[bi] != float("inf") else f">{lo}"
+            for name in backends:
+                st = stats.get((mode, bi, name))
+                if not st:
+                    continue
+                print(f"{mode:<6}{label:<14}{name:<8}{st['n']:>6}{st['time'] / st['n'] * 1000:>10.2f}"
+                      f"{st['agree'] / st['n']:>9.1%}{st['missed']:>6}")
+    return stats
+
+
+def replay_states(source, states_file="tasks/states.txt"):
+    """
+    用回放截图后端跑完整的 StateManager 状态识别（无需桌面），逐帧输出识别结果与耗时
+    """
+    from capture import ReplayCapture
+    from tasks.get_states import StateManager
+
+    capturer = ReplayCapture(source, loop=False)
+    mgr = StateManager(states_file, capture=capturer)
+    lat = []
+    for i in range(len(capturer)):
+        t0 = time.perf_counter()
+        state = mgr.get_raw_state(refresh=True)  # 每帧都要截图识别，不复用观察缓存
+        lat.append(time.perf_counter() - t0)
+        print(f"  帧 {i + 1:>3}: {state}  {lat[-1] * 1000:.1f}ms")
+    lat = np.array(lat)
+    print(f"{len(lat)} 帧, p50 {np.percentile(lat, 50) * 1000:.1f}ms, p95 {np.percentile(lat, 95) * 1000:.1f}ms")
+    return lat
+
+
+# ==================== 基准测试 ====================
+
+def build_ops(v, model_path, backends):
+    """
+    返回 {(操作, 后端): cases}，cases(img) 产生若干个无参调用，每个调用计一次耗时
+    依赖缺失的项返回原因字符串，报告中标记为跳过
+    """
+    keys = state_keys(v)
+
+    def with_mode(levels, margin, fn):
+        def run():
+            old = v.pyramid_levels, v.search_margin
+            v.pyramid_levels, v.search_margin = levels, margin
+            try:
+                fn()
+            finally:
+                v.pyramid_levels, v.search_margin = old
+        return run
+
+    modes = {"exhaustive": (0, None), "pyramid2": (2, None), "local": (0, v.search_margin)}
+    ops = {}
+    for mode, (levels, margin) in modes.items():
+        ops[("find_image", mode)] = lambda img, l=levels, m=margin: [
+            with_mode(l, m, lambda k=k: v.find_image(img, k)) for k in keys]
+        ops[("classify", mode)] = lambda img, l=levels, m=margin: [
+            with_mode(l, m, lambda: v.classify(img, keys))]
+
+    for backend in backends:
+        try:
+            det = create_detector(model_path, backend)
+            ops[("detect_yolo", backend)] = (lambda img, d=det: [lambda: d.detect(img)]) if det else "找不到模型文件"
+        except Exception as e:
+            ops[("detect_yolo", backend)] = f"加载失败: {e}"
+
+    try:
+        v._load_ocr()
+        limit = v.limit_scope("tasks/transport/mouse_combo/chose.png")
+        ops[("detect_text", "easyocr")] = lambda img: [lambda: v.detect_text(img, limit, n=16)]
+    except Exception as e:
+        ops[("detect_text", "easyocr")] = f"不可用: {e}"
+
+    # 计数区域直接取 chose.json 的标注框
+    digits = DigitReader()
+    entry = v.templates.get("tasks/transport/mouse_combo/chose.png")
+    if entry is not None and entry.box is not None:
+        (x1, y1), (x2, y2) = entry.box
+        w, h = entry.image_size
+        roi = [[x1 / w, y1 / h], [x2 / w, y2 / h]]
+        ops[("read_digits", "glyph")] = lambda img: [lambda: digits.read(img, roi)]
+    else:
+        ops[("read_digits", "glyph")] = "缺少 chose.json 标注"
+
+    try:
+        v.limit_scope("tasks/transport/mouse_combo/chose.png")
+        ops[("limit_scope", "json")] = lambda img: [lambda: v.limit_scope("tasks/transport/mouse_combo/chose.png")]
+    except Exception as e:
+        ops[("limit_scope", "json")] = f"不可用: {e}"
+
+    gate = FrameGate()
+    ops[("frame_gate", "compare")] = lambda img: [lambda: gate.get_or_compute(img, "bench", lambda: None)]
+    return ops
+
+
+def measure(cases_fn, screens, repeat=3):
+    """
+    对每张截图跑 cases，统计单次调用延迟 p50/p95/mean、吞吐量；
+    峰值内存单独用 tracemalloc 在第一张截图上测（tracemalloc 会拖慢计时）
+    """
+    lat = []
+    total = 0.0
+    for _ in range(repeat):
+        for _, img in screens:
+            for call in cases_fn(img):
+                t0 = time.perf_counter()
+                call()
+                dt = time.perf_counter() - t0
+                lat.append(dt)
+                total += dt
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for call in cases_fn(screens[0][1]):
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lat = np.array(lat)
+    return {
+        "n": int(len(lat)),
+        "p50_ms": float(np.percentile(lat, 50) * 1000),
+        "p95_ms": float(np.percentile(lat, 95) * 1000),
+        "mean_ms": float(lat.mean() * 1000),
+        "throughput": float(len(lat) / total) if total else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run_bench(v, screens, model_path, backends, repeat=3, only=None):
+    results = {}
+    print(f"{'操作':<14}{'后端':<12}{'次数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'次/秒':>10}{'峰值(KB)':>11}")
+    for (op, backend), cases in build_ops(v, model_path, backends).items():
+        if only and op not in only:
+            continue
+        name = f"{op}/{backend}"
+        if isinstance(cases, str):
+            print(f"{op:<14}{backend:<12}  跳过: {cases}")
+            continue
+        r = measure(cases, screens, repeat)
+        results[name] = r
+        print(f"{op:<14}{backend:<12}{r['n']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['throughput']:>10.1f}{r['peak_kb']:>11.0f}")
+    return results
+
+
+def save_baseline(results, path, screens):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "screens": len(screens),
+        },
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"💾 基线已保存: {path}")
+
+
+def compare_baseline(results, path, tolerance=0.2):
+    """与基线比较 p50/p95，变慢超过 tolerance 记为回归；返回回归项列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        base = json.load(f)["results"]
+    regressions = []
+    print(f"\n对比基线 {path}（容差 {tolerance:.0%}）:")
+    for name, r in results.items():
+        b = base.get(name)
+        if not b:
+            print(f"  {name:<26} 基线中没有")
+            continue
+        d50 = r["p50_ms"] / b["p50_ms"] - 1 if b["p50_ms"] else 0.0
+        d95 = r["p95_ms"] / b["p95_ms"] - 1 if b["p95_ms"] else 0.0
+        flag = "❌ 回归" if max(d50, d95) > tolerance else "✅"
+        if max(d50, d95) > tolerance:
+            regressions.append(name)
+        print(f"  {name:<26} p50 {d50:+7.1%}  p95 {d95:+7.1%}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="视觉模块对比测试")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("matcher", help="各模板匹配后端按模板面积分档对比耗时与一致率")
+    p.add_argument("--screens", nargs="+", default=["window", "screenshots"])
+    p.add_argument("--backends", nargs="+", default=list(MATCHERS))
+    p.add_argument("--margin", type=float, default=0.05)
+    p = sub.add_parser("bench", help="各视觉操作 p50/p95 延迟、吞吐、峰值内存，支持保存/对比基线")
+    p.add_argument("--captures", nargs="+", default=DEFAULT_SCREENS, help="录制截图目录")
+    p.add_argument("--model", default="models/best.pt")
+    p.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    p.add_argument("--ops", nargs="+", help="只测这些操作，如 find_image classify")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--save", help="保存为基线 JSON")
+    p.add_argument("--compare", help="与基线 JSON 对比，有回归时退出码为 1")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    p = sub.add_parser("pyramid", help="金字塔匹配 vs 穷举匹配 准确率/耗时对比")
+    p.add_argument("--levels", type=int, nargs="+", default=[1, 2])
+    p.add_argument("--screens", nargs="+", default=DEFAULT_SCREENS)
+    p = sub.add_parser("detector", help="YOLO 各后端启动/延迟对比")
+    p.add_argument("--model", default="models/best.pt")
+    p.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    p.add_argument("--batch", type=int, default=4, help="模拟的窗口数")
+    p.add_argument("--screens", nargs="+", default=DEFAULT_SCREENS)
+    p = sub.add_parser("states", help="回放截图目录/录像，跑完整状态识别流程（无需桌面）")
+    p.add_argument("--replay", default="window", help="截图目录或视频文件")
+    p.add_argument("--states", default="tasks/states.txt")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "states":
+        replay_states(args.replay, args.states)
+        return 0
+
+    screens = load_screens(args.captures if args.cmd == "bench" else args.screens)
+    if not screens:
+        print("❌ 没有可用的截图")
+        return 1
+    if args.cmd == "bench":
+        v = vision.MyVision(yolo_model_path=args.model)
+        results = run_bench(v, screens, args.model, args.backends, args.repeat, args.ops)
+        if args.save:
+            save_baseline(results, args.save, screens)
+        if args.compare and compare_baseline(results, args.compare, args.tolerance):
+            return 1
+    elif args.cmd == "matcher":
+        v = vision.MyVision()
+        compare_matchers(v.templates, screens, args.backends, args.margin)
+    elif args.cmd == "pyramid":
+        # 与原全分辨率穷举模式对比：关闭局部搜索（同 build_ops 的 exhaustive 模式）
+        v = vision.MyVision(search_margin=None)
+        compare_pyramid(v, screens, state_keys(v), args.levels)
+    elif args.cmd == "detector":
+        compare_detectors(args.model, screens, args.backends, args.batch)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
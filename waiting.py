@@ -0,0 +1,73 @@
+"""
+等待画面变化：代替点击后的固定 sleep
+
+- wait_for(predicate, timeout) 反复调用 predicate（通常是截图 + 识别），返回真值立即结束；
+  轮询间隔从 first 开始按 factor 递增到 max_interval（刚点击时画面变化快，等得越久越不需要频繁识别）
+- budget 为原来固定等待的秒数：与实际用时的差额按窗口累计，report() 打印省下（或多等）的时间
+- 等待时间计入 instrument 的 "wait"
+
+用法：
+    waiting.wait_for(lambda: mgr.current_page() == "lingdi", timeout=3.0, budget=1.0, name="lingdi")
+    mgr.wait_for("lingdi", timeout=3.0, budget=1.0)     # StateManager 封装好的状态等待
+"""
+import time
+import threading
+
+import instrument
+
+_lock = threading.Lock()
+_totals = {}  # {窗口: {"count", "hit", "elapsed", "budget"}}
+
+
+def wait_for(predicate, timeout=5.0, budget=None, first=0.1, factor=1.5, max_interval=0.5, name=None):
+    """
+    轮询 predicate() 直到返回真值或超时；先立即检查一次
+    返回 predicate 最后一次的结果（超时为假值）
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + timeout
+    interval = first
+    while True:
+        result = predicate()
+        now = time.perf_counter()
+        if result or now >= deadline:
+            break
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * factor, max_interval)
+    _record(name, time.perf_counter() - t0, budget, bool(result))
+    return result
+
+
+def _record(name, elapsed, budget, hit):
+    if instrument.enabled():
+        instrument.record("wait", elapsed)
+    if budget is not None:
+        saved = budget - elapsed
+        print(f"  ⏳ 等待 [{name}] {elapsed:.2f}s{'' if hit else '（超时）'}，"
+              f"原固定 {budget:.1f}s，{'省下' if saved >= 0 else '多等'} {abs(saved):.2f}s")
+    win = str(instrument.current_window())
+    with _lock:
+        t = _totals.setdefault(win, {"count": 0, "hit": 0, "elapsed": 0.0, "budget": 0.0})
+        t["count"] += 1
+        t["hit"] += hit
+        t["elapsed"] += elapsed
+        t["budget"] += budget if budget is not None else elapsed
+
+
+def stats(window=None):
+    win = str(window if window is not None else instrument.current_window())
+    with _lock:
+        return dict(_totals.get(win, {"count": 0, "hit": 0, "elapsed": 0.0, "budget": 0.0}))
+
+
+def report(window=None, tag=""):
+    s = stats(window)
+    if not s["count"]:
+        return
+    print(f"⏳ 等待统计{tag}: {s['count']} 次（{s['hit']} 次提前结束），实际 {s['elapsed']:.1f}s，"
+          f"原固定 {s['budget']:.1f}s，共省下 {s['budget'] - s['elapsed']:.1f}s")
+
+
+def reset():
+    with _lock:
+        _totals.clear()
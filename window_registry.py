@@ -0,0 +1,146 @@
+"""
+窗口注册表：进程内共用一份窗口列表，避免每次构造 Operator / 每次坐标转换都枚举全部窗口
+
+- 枚举一次（gw.getAllWindows），按句柄、标题建索引；超过 ttl 秒或调用 invalidate() 后下次查询重新枚举
+- 按句柄 / 标题查不到时自动重新枚举一次（新开的窗口），句柄失效（窗口已关闭）时从表中移除
+- 按标题查找与 gw.getWindowsWithTitle 相同：标题包含即可、不区分大小写；exact=True 要求标题完全相同
+- geometry(hwnd) 按需读取窗口位置（一次 GetWindowRect），max_age 秒内复用上次结果；移动/缩放窗口后调用 moved(hwnd)
+
+用法：
+    from window_registry import registry
+    w = registry.find("幸福小渔村")      # 标题(str) 或 句柄(int)
+    g = registry.geometry(w._hWnd)      # Geometry(left, top, width, height)
+"""
+import time
+import threading
+from collections import namedtuple
+
+Geometry = namedtuple("Geometry", "left top width height")
+
+
+class WindowRegistry:
+    def __init__(self, ttl=30.0, miss_interval=1.0):
+        self.ttl = ttl
+        self.miss_interval = miss_interval  # 查不到句柄时重新枚举的最短间隔，防止反复查已关闭窗口时连续枚举
+        self._lock = threading.RLock()
+        self._by_handle = {}
+        self._by_title = {}
+        self._stamp = None
+        self._geometry = {}  # hwnd → (读取时间, Geometry)
+
+    # ==================== 枚举 ====================
+    def refresh(self):
+        """重新枚举所有窗口"""
+        import pygetwindow as gw
+        windows = gw.getAllWindows()
+        with self._lock:
+            self._by_handle = {w._hWnd: w for w in windows}
+            self._by_title = {}
+            for w in windows:
+                self._by_title.setdefault(w.title, []).append(w)
+            self._stamp = time.monotonic()
+            self._geometry.clear()
+        return windows
+
+    def invalidate(self):
+        """窗口有增减（如启动/关闭游戏多开）时调用，下次查询重新枚举"""
+        with self._lock:
+            self._stamp = None
+
+    def _ensure(self):
+        with self._lock:
+            if self._stamp is None or time.monotonic() - self._stamp > self.ttl:
+                self.refresh()
+
+    # ==================== 查询 ====================
+    def _miss_stale(self):
+        """查不到时是否该重新枚举：距上次枚举超过 miss_interval（invalidate() 之后 _stamp 为 None，同样需要）"""
+        with self._lock:
+            return self._stamp is None or time.monotonic() - self._stamp > self.miss_interval
+
+    def get(self, hwnd):
+        """按句柄取窗口，不存在返回 None"""
+        self._ensure()
+        with self._lock:
+            w = self._by_handle.get(hwnd)
+        if w is None and self._miss_stale():
+            self.refresh()  # 可能是刚打开的窗口
+            with self._lock:
+                w = self._by_handle.get(hwnd)
+        return w
+
+    def _match_title(self, title, exact):
+        with self._lock:
+            if exact:
+                return list(self._by_title.get(title, []))
+            key = title.upper()
+            return [w for w in self._by_handle.values() if key in w.title.upper()]
+
+    def by_title(self, title, exact=False):
+        """
+        标题包含 title（不区分大小写，同 gw.getWindowsWithTitle）的所有窗口（多开时有多个）；
+        exact=True 只取标题完全相同的
+        """
+        self._ensure()
+        windows = self._match_title(title, exact)
+        if not windows and self._miss_stale():
+            self.refresh()  # 可能是刚打开的窗口
+            windows = self._match_title(title, exact)
+        return windows
+
+    def find(self, app_name_or_id):
+        """标题(str) 取第一个标题包含它的窗口，句柄(int) 取对应窗口；找不到返回 None"""
+        if isinstance(app_name_or_id, int):
+            return self.get(app_name_or_id)
+        if isinstance(app_name_or_id, str):
+            windows = self.by_title(app_name_or_id)
+            return windows[0] if windows else None
+        return None
+
+    def all(self):
+        self._ensure()
+        with self._lock:
+            return list(self._by_handle.values())
+
+    # ==================== 位置 ====================
+    def geometry(self, hwnd, max_age=0.0):
+        """
+        窗口位置 Geometry(left, top, width, height)；max_age 秒内复用上次读取的结果
+        窗口已关闭返回 None 并从表中移除
+        """
+        with self._lock:
+            cached = self._geometry.get(hwnd)
+        if cached is not None and time.monotonic() - cached[0] <= max_age:
+            return cached[1]
+        w = self.get(hwnd)
+        if w is None:
+            return None
+        try:
+            # pygetwindow 的 left/top/width/height 每次访问都会调用 GetWindowRect，这里一次读出
+            box = w.box
+            geo = Geometry(box.left, box.top, box.width, box.height)
+        except Exception:
+            self._drop(hwnd)
+            return None
+        with self._lock:
+            self._geometry[hwnd] = (time.monotonic(), geo)
+        return geo
+
+    def moved(self, hwnd=None):
+        """窗口移动/缩放/还原后调用，丢弃缓存的位置（hwnd=None 为全部）"""
+        with self._lock:
+            if hwnd is None:
+                self._geometry.clear()
+            else:
+                self._geometry.pop(hwnd, None)
+
+    def _drop(self, hwnd):
+        with self._lock:
+            w = self._by_handle.pop(hwnd, None)
+            self._geometry.pop(hwnd, None)
+            if w is not None and w in self._by_title.get(w.title, []):
+                self._by_title[w.title].remove(w)
+
+
+# 进程内共用
+registry = WindowRegistry()